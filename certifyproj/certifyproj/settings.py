@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'portal.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'certifyproj.urls'
@@ -88,6 +90,17 @@ DATABASES = {
     }
 }
 
+# Cache: list pages and their invalidation counters live here. The counters are
+# bumped by the web workers, the send worker and the management commands alike, so
+# list caching only switches on with a backend they all share (Redis, Memcached,
+# database, file). With the per-process default below it stays off.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CERT_LIST_CACHE_TIMEOUT = 300  # seconds a cached students/templates list page lives; 0 disables (so does a locmem cache)
+
 # MEDIA settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -144,4 +157,68 @@ LOGOUT_REDIRECT_URL = 'accounts:login'
 
 # Email (dev: console; prod: configure SMTP)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-DEFAULT_FROM_EMAIL = 'no-reply@certifypro.local'
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'no-reply@certifypro.local'
+CERT_EMAIL_BATCH_SIZE = 100     # messages sent per SMTP session in bulk paths
+CERT_EMAIL_MAX_RETRIES = 3      # retries for transient SMTP failures (drops, 4xx)
+CERT_EMAIL_RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled each time
+CERT_EMAIL_ASYNC = False        # send worker delivers over several concurrent SMTP sessions (portal.async_delivery)
+CERT_EMAIL_SESSIONS = 4         # concurrent SMTP sessions when CERT_EMAIL_ASYNC is on
+CERT_EMAIL_DOMAIN_RATE = 10.0   # max messages per second to any one recipient domain (0 = unlimited)
+CERT_EMAIL_DOMAIN_RATES = {}    # per-domain overrides, e.g. {'gmail.com': 2.0}
+
+# Certificate rendering
+CERT_RENDER_CACHE_BYTES = 256 * 1024 * 1024  # decoded template images kept in memory per process
+CERT_RENDER_WORKERS = None      # render processes used by the send worker; None = one per CPU, 1 = render inline
+CERT_PDF_ENGINE = 'raster'      # 'raster' burns text into a 150 DPI image; 'vector' embeds the template once with real text on top
+CERT_PDF_DPI = 150              # template pixels per inch when sizing vector PDF pages
+CERT_RENDER_DPI = 150           # uploaded templates are downscaled to the print size at this DPI
+CERT_PRINT_SIZE_INCHES = (11.69, 8.27)  # long x short side of the printed certificate (A4)
+CERT_PREVIEW_WIDTH = 800        # default longest side of /preview/ images, in pixels (always raster-rendered, see portal.previews)
+CERT_PREVIEW_CACHE_BYTES = 200 * 1024 * 1024  # disk cache for previews; least recently used files go first
+CERT_PREVIEW_DIR = None         # None = MEDIA_ROOT / 'previews'
+CERT_PREVIEW_MAX_AGE = 3600     # Cache-Control max-age for previews (the ETag changes with the content)
+
+# Student/template CSV import, export and bulk delete
+CERT_IMPORT_CHUNK_SIZE = 1000   # students inserted per bulk_create
+CERT_EXPORT_CHUNK_SIZE = 2000   # rows fetched per query when streaming CSV exports
+CERT_DELETE_CHUNK_SIZE = 500    # students deleted per transaction in bulk deletes
+CERT_DELETE_GRACE_SECONDS = 3600  # freed certificate files reused by a render this recently are kept
+
+# Student search: 'auto' uses the MySQL FULLTEXT index on MySQL and the token table elsewhere;
+# 'fulltext' or 'tokens' forces one. The token table is kept on both: FULLTEXT hands it the
+# words InnoDB doesn't index (under 3 characters, stopwords, digit halves of halltickets).
+CERT_SEARCH_BACKEND = 'auto'
+CERT_APPROXIMATE_COUNTS = False  # show the table-statistics estimate instead of COUNT(*) on the unfiltered students list
+
+# Certificate downloads: '' serves from Django, 'x-sendfile' (Apache/lighttpd) or
+# 'x-accel-redirect' (nginx, with an internal location at CERT_DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT)
+CERT_DOWNLOAD_OFFLOAD = ''
+CERT_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Send queue (processed by `manage.py run_send_worker`)
+CERT_SEND_BATCH_SIZE = 50       # items claimed per worker batch
+CERT_SEND_MAX_ATTEMPTS = 3      # tries per student before the item is marked ERROR
+CERT_SEND_CLAIM_TIMEOUT = 600   # seconds before a claimed item is considered abandoned
+CERT_SEND_RETRY_BACKOFF = 30    # seconds before a failed item is retried, doubled after each attempt
+CERT_PIPELINE = False           # send worker overlaps render, DB writes and SMTP (portal.pipeline); same as --pipeline
+CERT_PIPELINE_RENDER_WORKERS = None  # threads feeding the render pool; None = CERT_RENDER_WORKERS
+CERT_PIPELINE_DELIVER_WORKERS = 4    # concurrent SMTP sessions in the deliver stage
+CERT_PIPELINE_QUEUE_DEPTH = 32  # items buffered between stages; caps certificates in flight
+CERT_PIPELINE_DB_BATCH = 100    # rows written per bulk statement in the persist and log stages
+
+# Archival (`manage.py archive_records`, e.g. nightly from cron; look rows up with `archive_lookup`)
+CERT_ARCHIVE_AFTER_DAYS = 365   # SendLog / Certificate / report rows older than this leave the hot tables
+CERT_ARCHIVE_CHUNK_SIZE = 5000  # rows moved per batch
+CERT_ARCHIVE_DIR = None         # None = MEDIA_ROOT / 'archive'
+
+# Metrics (staff-only Prometheus text at /metrics/)
+CERT_METRICS_DIR = Path(tempfile.gettempdir()) / 'certifyproj-metrics'  # per-process histograms are merged from here; None = this process only
+CERT_METRICS_MAX_AGE = 3600       # a process file not flushed for this long is folded into retired.json (as are files of exited processes)
+CERT_METRICS_LOG_REQUESTS = False  # log one JSON line per request to the 'portal.requests' logger
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'portal.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False}},
+}
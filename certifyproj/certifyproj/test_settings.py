@@ -0,0 +1,25 @@
+"""
+Settings for tests and benchmarks: SQLite, in-memory email, throwaway media.
+
+    python manage.py test --settings=certifyproj.test_settings
+    python manage.py benchmark --settings=certifyproj.test_settings
+"""
+
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',  # tests and benchmarks create their own in-memory test database
+        'TEST': {'NAME': None},
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+MEDIA_ROOT = Path(tempfile.mkdtemp(prefix='certifyproj-media-'))
+CERT_METRICS_DIR = None  # tests that need the shared directory point it at a temp dir
+SILENCED_SYSTEM_CHECKS = ['staticfiles.W004']
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Student, Template, SendLog, Certificate
+from django.db import transaction
+from . import stats
+from .models import Student, Template, SendLog, Certificate, SendJob, DeliveryStat, DeliveryLedger
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -14,6 +16,38 @@ class TemplateAdmin(admin.ModelAdmin):
 class SendLogAdmin(admin.ModelAdmin):
     list_display = ('id','student','recipient_email','status','sent_at','resend_count','download_count')
 
+    # keep the DeliveryStat rollup in step with hand edits and deletes
+    def save_model(self, request, obj, form, change):
+        old = SendLog.objects.filter(pk=obj.pk).first() if change else None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            stats.record_edit(old, obj)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            stats.forget_logs([obj])
+
+    def delete_queryset(self, request, queryset):
+        logs = list(queryset)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            stats.forget_logs(logs)
+
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
     list_display = ('id','student','template','created_at')
+
+@admin.register(SendJob)
+class SendJobAdmin(admin.ModelAdmin):
+    list_display = ('id','created_by','status','total','skipped','created_at','finished_at')
+
+@admin.register(DeliveryStat)
+class DeliveryStatAdmin(admin.ModelAdmin):
+    list_display = ('day','course','sent','failed','resent','downloaded')
+    list_filter = ('course',)
+
+@admin.register(DeliveryLedger)
+class DeliveryLedgerAdmin(admin.ModelAdmin):
+    list_display = ('student','template','content_key','delivered_at')
+    raw_id_fields = ('student',)
@@ -0,0 +1,144 @@
+"""
+Archival of old log and report rows.
+
+Rows older than a cutoff day are moved, in chunks, out of the hot tables
+into gzip-compressed JSON Lines files partitioned by day, one file per chunk
+of a day named by its id range:
+
+    <CERT_ARCHIVE_DIR>/<table>/<YYYY>/<YYYY-MM-DD>.<min id>-<max id>.jsonl.gz
+    <CERT_ARCHIVE_DIR>/<table>/index.json
+
+The index lists each partition's files, row count and id range, plus
+`until`, the day before which the table has been archived; readers only
+open files the index lists. Each chunk is written and indexed before it is
+deleted, so a crash can leave a row in both places but never in neither.
+The next run skips rows the index already covers, and a chunk file that
+never made it into the index is rewritten or ignored, so nothing is counted
+twice. The DeliveryStat rollup is not touched, and stats.rebuild() leaves
+archived days alone.
+"""
+import gzip, json, os
+from datetime import date, datetime, time
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import SendLog, Certificate, ReportSuccess, ReportError
+
+# table name -> (model, date field that decides its age)
+TABLES = {
+    'sendlog': (SendLog, 'sent_at'),
+    'certificate': (Certificate, 'created_at'),
+    'reportsuccess': (ReportSuccess, 'created_at'),
+    'reporterror': (ReportError, 'created_at'),
+}
+
+
+def archive_root():
+    return Path(getattr(settings, 'CERT_ARCHIVE_DIR', None) or Path(settings.MEDIA_ROOT) / 'archive')
+
+
+def _index_path(table):
+    return archive_root() / table / 'index.json'
+
+
+def load_index(table):
+    try:
+        return json.loads(_index_path(table).read_text())
+    except FileNotFoundError:
+        return {'until': None, 'partitions': {}}
+
+
+def _save_index(table, index):
+    path = _index_path(table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(index, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def archived_until(table):
+    """Rows of `table` dated before this day live in the archive (None if nothing was archived)."""
+    until = load_index(table)['until']
+    return date.fromisoformat(until) if until else None
+
+
+def _cutoff(before):
+    return timezone.make_aware(datetime.combine(before, time.min))
+
+
+def pending(table, before):
+    model, field = TABLES[table]
+    return model.objects.filter(**{f'{field}__lt': _cutoff(before)}).count()
+
+
+def _write_rows(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+    os.replace(tmp, path)
+
+
+def archive_table(table, before, chunk_size=None):
+    """Move rows of `table` dated before the day `before` into the archive; returns how many moved."""
+    model, field = TABLES[table]
+    chunk_size = chunk_size or getattr(settings, 'CERT_ARCHIVE_CHUNK_SIZE', 5000)
+    pk = model._meta.pk.attname
+    qs = model.objects.filter(**{f'{field}__lt': _cutoff(before)}).order_by(pk)
+    index = load_index(table)
+    moved = 0
+    while True:
+        rows = list(qs.values()[:chunk_size])
+        if not rows:
+            break
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(timezone.localdate(row[field]), []).append(row)
+        for day, day_rows in by_day.items():
+            part = index['partitions'].get(day.isoformat())
+            if part:
+                # chunks go in id order, so an id inside the range was archived by a run that died before deleting
+                day_rows = [row for row in day_rows if not part['min_id'] <= row[pk] <= part['max_id']]
+                if not day_rows:
+                    continue
+            ids = [row[pk] for row in day_rows]
+            rel = f"{table}/{day:%Y}/{day.isoformat()}.{min(ids)}-{max(ids)}.jsonl.gz"
+            _write_rows(archive_root() / rel, day_rows)
+            part = index['partitions'].setdefault(day.isoformat(), {'files': [], 'rows': 0, 'min_id': min(ids), 'max_id': max(ids)})
+            part['files'].append(rel)
+            part['rows'] += len(day_rows)
+            part['min_id'] = min(part['min_id'], min(ids))
+            part['max_id'] = max(part['max_id'], max(ids))
+        _save_index(table, index)
+        model.objects.filter(**{f'{pk}__in': [row[pk] for row in rows]}).delete()
+        moved += len(rows)
+    if not index['until'] or before.isoformat() > index['until']:
+        index['until'] = before.isoformat()
+        _save_index(table, index)
+    return moved
+
+
+def iter_partition(table, day):
+    """Archived rows of `table` for one day, as dicts."""
+    part = load_index(table)['partitions'].get(str(day))
+    if not part:
+        return
+    for rel in part['files']:
+        with gzip.open(archive_root() / rel, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def lookup(table, pk):
+    """The archived row of `table` with this primary key, or None."""
+    model = TABLES[table][0]
+    field = model._meta.pk.attname
+    for day, part in sorted(load_index(table)['partitions'].items()):
+        if part['min_id'] <= pk <= part['max_id']:
+            for row in iter_partition(table, day):
+                if row[field] == pk:
+                    return row
+    return None
@@ -0,0 +1,90 @@
+"""
+Concurrent certificate email delivery on asyncio.
+
+Messages are spread over CERT_EMAIL_SESSIONS SMTP sessions, each a Mailer
+(one connection, retries, reconnects) driven from a worker thread, so the
+network round-trips of different sessions overlap. Each recipient domain is
+additionally paced to CERT_EMAIL_DOMAIN_RATE messages per second (override
+per domain with CERT_EMAIL_DOMAIN_RATES) to stay under provider limits.
+"""
+import asyncio, threading, time
+from django.conf import settings
+
+from .mailer import Mailer
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class DomainRateLimiter:
+    """Spaces sends to the same domain at least 1/rate seconds apart."""
+
+    def __init__(self, rate=None, rates=None):
+        self.rate = _setting('CERT_EMAIL_DOMAIN_RATE', 10.0) if rate is None else rate
+        self.rates = _setting('CERT_EMAIL_DOMAIN_RATES', {}) if rates is None else rates
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def _delay(self, domain, now):
+        # reserve the domain's next slot; returns how long to wait for it
+        rate = self.rates.get(domain, self.rate)
+        if not rate:
+            return 0
+        with self._lock:
+            slot = max(now, self._next.get(domain, now))
+            self._next[domain] = slot + 1.0 / rate
+        return slot - now
+
+    async def acquire(self, domain):
+        delay = self._delay(domain, asyncio.get_running_loop().time())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait(self, domain):
+        """Blocking acquire() for callers on plain threads."""
+        delay = self._delay(domain, time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+
+
+def domain_of(message):
+    recipient = (message.recipients() or [''])[0]
+    return recipient.rpartition('@')[2].lower()
+
+
+async def deliver_async(messages, sessions=None, limiter=None):
+    """Send messages over several SMTP sessions at once; returns [(message, error)] in input order."""
+    messages = list(messages)
+    sessions = sessions or _setting('CERT_EMAIL_SESSIONS', 4)
+    limiter = limiter or DomainRateLimiter()
+    batch_size = _setting('CERT_EMAIL_BATCH_SIZE', 100)
+
+    pool = asyncio.Queue()
+    mailers = [Mailer() for _ in range(min(sessions, len(messages)) or 1)]
+    for mailer in mailers:
+        mailer.sent = 0
+        pool.put_nowait(mailer)
+
+    async def send(message):
+        await limiter.acquire(domain_of(message))
+        mailer = await pool.get()
+        try:
+            error = await asyncio.to_thread(mailer.send_one, message)
+            mailer.sent += 1
+            if mailer.sent % batch_size == 0:
+                # start a fresh SMTP session every CERT_EMAIL_BATCH_SIZE messages
+                await asyncio.to_thread(mailer.close)
+            return message, error
+        finally:
+            pool.put_nowait(mailer)
+
+    try:
+        return await asyncio.gather(*(send(m) for m in messages))
+    finally:
+        await asyncio.gather(*(asyncio.to_thread(m.close) for m in mailers))
+
+
+def deliver(messages, **kwargs):
+    """Synchronous entry point for callers outside an event loop (the send worker)."""
+    return asyncio.run(deliver_async(messages, **kwargs))
@@ -0,0 +1,177 @@
+"""
+Benchmarks for the certificate pipeline and the hot portal views.
+
+Each stage is a (setup, run) pair. run() is timed on its own, then (unless
+disabled) repeated under tracemalloc to record peak allocations, and the
+queries it issued are counted. Run through `manage.py benchmark`.
+"""
+import gc, io, time, tracemalloc
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from . import jobs, pagination
+from .models import Student, Template, SendLog, Certificate, SendJob, DeliveryLedger
+from .utils import generate_certificate_image, save_certificate, invalidate_template_cache
+
+RESOLUTIONS = [(1123, 794), (1754, 1240), (3508, 2480)]  # A4 landscape at 96, 150 and 300 DPI
+
+
+def measure(name, run, setup=None, repeat=1, alloc=True, **params):
+    """Time `run` (called `repeat` times), then record peak allocation and query count."""
+    if setup:
+        setup()
+    gc.collect()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = time.perf_counter() - start
+    result = {
+        'stage': name,
+        'params': params,
+        'seconds': round(elapsed, 6),
+        'per_call': round(elapsed / repeat, 6),
+        'queries': len(queries.captured_queries) // repeat,
+    }
+    if alloc:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        run()
+        result['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def make_template(size, course='BENCH'):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (250, 245, 230)).save(buf, 'PNG')
+    tpl = Template(name=f"Bench {size[0]}x{size[1]}", course=course, template_type='landscape')
+    tpl.file.save(f"bench_{size[0]}x{size[1]}.png", ContentFile(buf.getvalue()), save=False)
+    tpl.save()
+    return tpl
+
+
+def students_csv(rows, prefix='B'):
+    lines = ['hallticket,name,course,email,phone']
+    lines += [f"{prefix}{i},Student {i},BENCH,{prefix.lower()}{i}@example.com,9{i:09d}" for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def seed_students(count, tpl=None):
+    Student.objects.all().delete()
+    Student.objects.bulk_create([
+        Student(sno=i + 1, hallticket=f"S{i}", name=f"Student {i}", course='BENCH',
+                email=f"s{i}@example.com", template=tpl)
+        for i in range(count)
+    ], batch_size=1000)
+
+
+def seed_logs(count):
+    SendLog.objects.all().delete()
+    snos = list(Student.objects.values_list('sno', flat=True)[:count])
+    SendLog.objects.bulk_create([
+        SendLog(student_id=sno, recipient_email=f"s{i}@example.com", course='BENCH', status='SUCCESS' if i % 5 else 'ERROR')
+        for i, sno in enumerate(snos)
+    ], batch_size=1000)
+
+
+def client():
+    user, _ = get_user_model().objects.get_or_create(username='bench', defaults={'is_staff': True})
+    c = Client()
+    c.force_login(user)
+    return c
+
+
+def bench_render(alloc=True, repeat=5):
+    results = []
+    out_dir = Template._meta.get_field('file').storage.path('bench')
+    for size in RESOLUTIONS:
+        tpl = make_template(size)
+        path = tpl.file.path
+        invalidate_template_cache()
+        results.append(measure('render_cold', lambda: generate_certificate_image(path, 'Ada Lovelace', 'BENCH', '01-01-2025'),
+                               setup=invalidate_template_cache, alloc=alloc, resolution=f"{size[0]}x{size[1]}"))
+        results.append(measure('render', lambda: generate_certificate_image(path, 'Ada Lovelace', 'BENCH', '01-01-2025'),
+                               repeat=repeat, alloc=alloc, resolution=f"{size[0]}x{size[1]}"))
+        im = generate_certificate_image(path, 'Ada Lovelace', 'BENCH', '01-01-2025')
+        results.append(measure('save_pdf', lambda: save_certificate(im, out_dir, 'bench'),
+                               repeat=repeat, alloc=alloc, resolution=f"{size[0]}x{size[1]}"))
+        tpl.delete()
+    return results
+
+
+def bench_import(sizes, alloc=True):
+    results = []
+    c = client()
+    make_template(RESOLUTIONS[0])
+    for rows in sizes:
+        data = students_csv(rows)
+        post = lambda: c.post('/students/import/', {'file': SimpleUploadedFile('students.csv', data, 'text/csv')})
+        results.append(measure('students_import_csv', post, setup=lambda: Student.objects.all().delete(),
+                               alloc=alloc, rows=rows))
+    return results
+
+
+def bench_bulk_send(count, alloc=True):
+    c = client()
+    tpl = make_template(RESOLUTIONS[0])
+    seed_students(count, tpl)
+
+    def reset():
+        # every pass sends to everyone: forget earlier deliveries, or the send-once ledger skips them all
+        SendJob.objects.all().delete()
+        SendLog.objects.all().delete()
+        DeliveryLedger.objects.all().delete()
+        Certificate.objects.all().delete()
+        mail.outbox = []
+
+    def run():
+        c.post('/students/bulk_send/', {'select_all': 'true'})
+        while jobs.run_batch():
+            pass
+
+    return [measure('bulk_send', run, setup=reset, alloc=alloc, students=count)]
+
+
+def bench_views(count, alloc=True, repeat=5):
+    c = client()
+    tpl = make_template(RESOLUTIONS[0])
+    seed_students(count, tpl)
+    seed_logs(count)
+
+    deep_cursor = pagination.encode([count - 5], 'next')
+
+    def export():
+        b''.join(c.get('/students/export/').streaming_content)
+
+    return [
+        measure('students_export_csv', export, alloc=alloc, students=count),
+        measure('students', lambda: c.get('/students/'), repeat=repeat, alloc=alloc, students=count),
+        measure('students_search', lambda: c.get('/students/?q=student 12'), repeat=repeat, alloc=alloc, students=count),
+        measure('students_deep_page', lambda: c.get('/students/', {'cursor': deep_cursor}), repeat=repeat, alloc=alloc, students=count),
+        measure('reports', lambda: c.get('/reports/'), repeat=repeat, alloc=alloc, logs=count),
+        measure('reports_search', lambda: c.get('/reports/?q=student'), repeat=repeat, alloc=alloc, logs=count),
+    ]
+
+
+def result_key(result):
+    return result['stage'] + ''.join(f";{k}={v}" for k, v in sorted(result['params'].items()))
+
+
+def compare(current, previous, threshold):
+    """Return (key, old, new) for stages whose per-call time grew by more than `threshold` (0.2 = 20%)."""
+    old = {result_key(r): r for r in previous}
+    regressions = []
+    for r in current:
+        before = old.get(result_key(r))
+        if before and before['per_call'] > 0 and r['per_call'] > before['per_call'] * (1 + threshold):
+            regressions.append((result_key(r), before['per_call'], r['per_call']))
+    return regressions
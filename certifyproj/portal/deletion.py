@@ -0,0 +1,78 @@
+import os, time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Student, Certificate, SendLog, PendingFileDeletion
+
+
+def _chunk_size():
+    return getattr(settings, 'CERT_DELETE_CHUNK_SIZE', 500)
+
+
+def delete_students(qs, chunk_size=None):
+    """Delete the students in qs a chunk at a time, one short transaction per chunk.
+
+    Their certificate files are queued in PendingFileDeletion instead of being
+    left on disk. Returns the number of students deleted.
+    """
+    chunk_size = chunk_size or _chunk_size()
+    deleted = 0
+    while True:
+        ids = list(qs.order_by('sno').values_list('sno', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            names = set(Certificate.objects.filter(student_id__in=ids).values_list('file', flat=True))
+            names.update(Student.objects.filter(sno__in=ids).exclude(last_certificate='').values_list('last_certificate', flat=True))
+            PendingFileDeletion.objects.bulk_create([PendingFileDeletion(name=n) for n in names if n])
+            Student.objects.filter(sno__in=ids).delete()
+        deleted += len(ids)
+
+
+def _in_use(names):
+    # a file can still be in use: log attachments outlive their student, and
+    # content-addressed certificates can be re-attached by a new student
+    in_use = set(Certificate.objects.filter(file__in=names).values_list('file', flat=True))
+    in_use.update(SendLog.objects.filter(attachment__in=names).values_list('attachment', flat=True))
+    in_use.update(Student.objects.filter(last_certificate__in=names).values_list('last_certificate', flat=True))
+    return in_use
+
+
+def purge_pending_files(limit=500, grace=None):
+    """Remove up to `limit` queued files that nothing references any more; returns how many rows were handled.
+
+    Only rows queued more than `grace` seconds (CERT_DELETE_GRACE_SECONDS) ago
+    are looked at. A render that reuses an existing certificate file touches it
+    before the new reference is committed (rendering.render_to_file), so
+    candidates are first moved aside, then checked again: a file touched within
+    `grace` or referenced by now is put back. A render that looks for the file
+    while it is aside simply renders it again.
+    """
+    grace = grace if grace is not None else getattr(settings, 'CERT_DELETE_GRACE_SECONDS', 3600)
+    queued_before = timezone.now() - timedelta(seconds=grace)
+    pending = list(PendingFileDeletion.objects.filter(created_at__lte=queued_before).order_by('id')[:limit])
+    if not pending:
+        return 0
+    media = str(settings.MEDIA_ROOT)
+    names = {p.name for p in pending}
+    aside = {}
+    for name in names - _in_use(names):
+        path = os.path.join(media, name)
+        try:
+            os.replace(path, f"{path}.purging")
+        except FileNotFoundError:
+            continue
+        aside[name] = path
+    if aside:
+        recent = time.time() - grace
+        in_use = _in_use(list(aside))
+        for name, path in aside.items():
+            tomb = f"{path}.purging"
+            if name in in_use or os.stat(tomb).st_mtime > recent:
+                os.replace(tomb, path)  # a same-named fresh render has the same content
+            else:
+                os.remove(tomb)
+    PendingFileDeletion.objects.filter(id__in=[p.id for p in pending]).delete()
+    return len(pending)
@@ -0,0 +1,72 @@
+import os
+from datetime import date
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from .models import Template, Certificate
+from .rendering import render_to_file
+from .utils import certificate_key
+from . import metrics
+
+
+def course_templates(courses):
+    """First template per course, in one query (what pick_template falls back to)."""
+    templates = {}
+    for tpl in Template.objects.filter(course__in=set(courses)).order_by('sno'):
+        templates.setdefault(tpl.course, tpl)
+    return templates
+
+
+def pick_template(student, templates=None):
+    # choose template (student.template or by course); `templates` is a course_templates() map
+    if student.template:
+        tpl = student.template
+    elif templates is not None:
+        tpl = templates.get(student.course)
+    else:
+        tpl = Template.objects.filter(course=student.course).first()
+    if not tpl:
+        raise ValueError("No template found for student's course.")
+    return tpl
+
+
+def render_task(student, tpl):
+    """Everything a render worker needs, as plain picklable values."""
+    today = date.today().strftime("%d-%m-%Y")
+    key = certificate_key(tpl.render_path, student.name, student.course, today)
+    return (tpl.render_path, student.name, student.course, today,
+            str(settings.MEDIA_ROOT / 'certificates'), f"{student.hallticket}_{key[:20]}")
+
+
+def prepare_certificate(student, tpl, path):
+    """Point the student at the rendered file and return the (unsaved) Certificate row."""
+    student.last_certificate = path.replace(str(settings.MEDIA_ROOT) + os.sep, '')
+    student.template = tpl
+    return Certificate(student=student, template=tpl, file=student.last_certificate)
+
+
+@metrics.timed('db_certificate')
+def attach_certificate(student, tpl, path):
+    cert = prepare_certificate(student, tpl, path)
+    student.save(update_fields=['last_certificate', 'template'])
+    cert.save()
+    return cert
+
+
+@metrics.timed('make_certificate')
+def _make_and_attach_certificate(student):
+    tpl = pick_template(student)
+    path = render_to_file(render_task(student, tpl))
+    return attach_certificate(student, tpl, path)
+
+
+def certificate_email(student, attach_path, to=None, resend=False):
+    if resend:
+        subject = "Your Certificate (Resent)"
+        body = f"Dear {student.name},\n\nResending your certificate.\n\nRegards,\nCertifyPro"
+    else:
+        subject = "Your Certificate"
+        body = f"Dear {student.name},\n\nPlease find your certificate attached.\n\nRegards,\nCertifyPro"
+    email = EmailMessage(subject=subject, body=body, to=[to or student.email])
+    email.attach_file(attach_path)
+    return email
@@ -0,0 +1,145 @@
+import os, re, time, zipfile
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, parse_etags
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(st):
+    return quote_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+
+def _parse_range(request, size, etag, last_modified):
+    """Return (start, end) for a single satisfiable byte range, None for the whole file, or False if unsatisfiable."""
+    header = request.headers.get('Range', '')
+    m = RANGE_RE.match(header.strip())
+    if not m or not any(m.groups()):
+        return None
+    # If-Range: only honour the range if the client still has this version
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != last_modified and etag not in parse_etags(if_range):
+        return None
+    start, end = m.groups()
+    if start:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    else:
+        # suffix range: last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+def serve_file(request, path, filename, content_type='application/octet-stream', media_name=None):
+    """Serve a file from disk without buffering it in the worker.
+
+    Handles If-None-Match / If-Modified-Since (304), single byte ranges (206)
+    and, when CERT_DOWNLOAD_OFFLOAD is 'x-sendfile' or 'x-accel-redirect',
+    hands the transfer to the front proxy. `media_name` is the path relative to
+    MEDIA_ROOT, used for X-Accel-Redirect. Returns the response; its
+    `counts_as_download` attribute is False for 304s and range continuations.
+    """
+    st = os.stat(path)
+    etag = file_etag(st)
+    last_modified = http_date(st.st_mtime)
+
+    def with_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if conditional is not None:
+        conditional.counts_as_download = False
+        return with_headers(conditional)
+
+    offload = getattr(settings, 'CERT_DOWNLOAD_OFFLOAD', '')
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-accel-redirect':
+            prefix = getattr(settings, 'CERT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + (media_name or os.path.basename(path))
+        else:
+            response['X-Sendfile'] = path
+        response.counts_as_download = True
+        return with_headers(response)
+
+    byte_range = _parse_range(request, st.st_size, etag, last_modified)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{st.st_size}'
+        response.counts_as_download = False
+        return with_headers(response)
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+        response.counts_as_download = start == 0
+        return with_headers(response)
+
+    # FileResponse lets the WSGI server use sendfile() where available
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response.counts_as_download = True
+    return with_headers(response)
+
+
+class _ZipSink:
+    # write-only target for ZipFile; without tell() it writes streaming-style data descriptors
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of (arcname, path) entries while it is being built.
+
+    Entries are stored uncompressed (PDFs are already compressed) and copied in
+    CHUNK_SIZE blocks, so memory stays flat however many files go in. Paths
+    that no longer exist are skipped.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            try:
+                src = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with src:
+                st = os.fstat(src.fileno())
+                info = zipfile.ZipInfo(arcname, max(time.localtime(st.st_mtime)[:6], (1980, 1, 1, 0, 0, 0)))
+                info.file_size = st.st_size
+                with archive.open(info, 'w') as dest:
+                    while data := src.read(CHUNK_SIZE):
+                        dest.write(data)
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
@@ -1,11 +1,31 @@
 from django import forms
 from .models import Template, Student
+from .utils import IMAGE_ERRORS, template_derivatives
 
 class TemplateForm(forms.ModelForm):
     class Meta:
         model = Template
         fields = ['name','file','course','template_type']
 
+    derivatives = None  # template_derivatives() result when the save needs new ones
+
+    def clean(self):
+        cleaned = super().clean()
+        image = cleaned.get('file')
+        changed = {'file', 'template_type'} & set(self.changed_data)
+        if image and 'template_type' in cleaned and (changed or not self.instance.render_file):
+            # decode now, so an image Pillow can't process is a form error rather than a half-saved template
+            if 'file' in self.changed_data:
+                image.seek(0)
+                source = image
+            else:
+                source = image.path
+            try:
+                self.derivatives = template_derivatives(source, cleaned['template_type'])
+            except IMAGE_ERRORS as e:
+                self.add_error('file', f"This image could not be processed ({e}).")
+        return cleaned
+
 class StudentForm(forms.ModelForm):
     class Meta:
         model = Student
@@ -0,0 +1,88 @@
+import csv
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .models import Student, Template
+from .search import index_students
+from . import listcache
+
+
+def _max_length(field):
+    return Student._meta.get_field(field).max_length
+
+
+def _clean_row(row):
+    if None in row:
+        # more fields than the header: csv.DictReader collects the extras in a list under None
+        return None
+    # normalize keys (lowercase & strip spaces)
+    row = {(k or '').strip().lower(): (v or "").strip() for k, v in row.items()}
+    hallticket = row.get('hallticket')
+    if not hallticket:
+        return None
+    data = {
+        'hallticket': hallticket,
+        'name': row.get('name', ''),
+        'course': row.get('course', ''),
+        'email': row.get('email') or f"{hallticket}@example.com",  # fallback
+        'phone': row.get('phone', ''),
+    }
+    for field, value in data.items():
+        if len(value) > _max_length(field):
+            return None
+    try:
+        validate_email(data['email'])
+    except ValidationError:
+        return None
+    return data
+
+
+def import_students(text_file, chunk_size=None):
+    """Import students from a CSV text stream.
+
+    Existing halltickets and the course -> template map are loaded once up front,
+    then new rows are inserted with bulk_create, one transaction per chunk.
+    Returns {'created': n, 'skipped': n, 'invalid': n}; skipped rows are
+    halltickets that already exist (or repeat within the file).
+    """
+    chunk_size = chunk_size or getattr(settings, 'CERT_IMPORT_CHUNK_SIZE', 1000)
+    seen = set(Student.objects.values_list('hallticket', flat=True))
+    templates = {}
+    for sno, course in Template.objects.order_by('sno').values_list('sno', 'course'):
+        templates.setdefault(course, sno)
+
+    # Get the last student number to continue from there
+    last_student = Student.objects.order_by('-sno').first()
+    next_sno = last_student.sno + 1 if last_student else 1
+
+    summary = {'created': 0, 'skipped': 0, 'invalid': 0}
+    chunk = []
+
+    def flush():
+        with transaction.atomic():
+            Student.objects.bulk_create(chunk)
+            index_students(chunk)
+        summary['created'] += len(chunk)
+        chunk.clear()
+
+    for row in csv.DictReader(text_file):
+        data = _clean_row(row)
+        if data is None:
+            summary['invalid'] += 1
+            continue
+        if data['hallticket'] in seen:
+            summary['skipped'] += 1
+            continue
+        seen.add(data['hallticket'])
+        chunk.append(Student(sno=next_sno, template_id=templates.get(data['course']), **data))
+        next_sno += 1
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    if summary['created']:
+        # bulk_create skips post_save
+        listcache.bump('student')
+    return summary
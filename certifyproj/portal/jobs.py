@@ -0,0 +1,311 @@
+import os, socket
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from .models import Student, SendLog, SendJob, SendJobItem, Certificate
+from .delivery import course_templates, pick_template, render_task, prepare_certificate, certificate_email
+from .rendering import render_many, render_one, worker_count
+from .mailer import Mailer
+from .utils import iter_chunks
+from . import async_delivery
+from . import stats, metrics, listcache, pipeline, ledger
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(students, user=None, force=False, chunk_size=1000):
+    """Create a SendJob with one PENDING item per student and return it.
+
+    `students` is a Student queryset or a list of snos. Either way it is walked
+    in keyset chunks, so a select-all never becomes one big list of ids.
+    Unless `force` is set, students who already received their current
+    certificate (portal.ledger) or are still queued in an earlier job are
+    left out and counted in job.skipped.
+    """
+    if not isinstance(students, QuerySet):
+        students = Student.objects.filter(sno__in=students)
+    with transaction.atomic():
+        job = SendJob.objects.create(created_by=user if user and user.is_authenticated else None)
+        for chunk in iter_chunks(students.select_related('template'), chunk_size, key='sno'):
+            wanted = chunk if force else ledger.undelivered(chunk)
+            SendJobItem.objects.bulk_create([SendJobItem(job=job, student_id=s.sno) for s in wanted])
+            job.total += len(wanted)
+            job.skipped += len(chunk) - len(wanted)
+        job.save(update_fields=['total', 'skipped'])
+    return job
+
+
+def claim_batch(size=None, worker=WORKER_ID):
+    """Claim up to `size` items. CLAIMED items whose worker went quiet are picked up again.
+
+    PENDING items that failed before wait until their retry_after has passed.
+    """
+    size = size or _setting('CERT_SEND_BATCH_SIZE', 50)
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('CERT_SEND_CLAIM_TIMEOUT', 600))
+    due = Q(retry_after__isnull=True) | Q(retry_after__lte=now)
+    with transaction.atomic():
+        ids = list(
+            SendJobItem.objects.select_for_update(skip_locked=True)
+            .filter(Q(due, state='PENDING') | Q(state='CLAIMED', claimed_at__lt=stale))
+            .order_by('id').values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            return []
+        SendJobItem.objects.filter(id__in=ids).update(state='CLAIMED', claimed_by=worker, claimed_at=timezone.now())
+        SendJob.objects.filter(items__id__in=ids, status='PENDING').update(status='RUNNING')
+    return list(SendJobItem.objects.filter(id__in=ids).select_related('student', 'student__template').order_by('id'))
+
+
+class _Writes:
+    """Rows a batch produces, written with bulk statements instead of one INSERT/UPDATE per student.
+
+    Certificates are saved before their emails go out. After delivery the item
+    states are committed on their own, ahead of the logs and ledger, so a failed
+    log write can't leave sent items CLAIMED to be sent again.
+    """
+
+    def __init__(self):
+        self.students = {}
+        self.certificates = []
+        self.logs = []
+        self.deliveries = []
+
+    def certificate(self, student, tpl, path):
+        cert = prepare_certificate(student, tpl, path)
+        self.students[student.pk] = student
+        self.certificates.append(cert)
+        return cert
+
+    def log(self, student, status, **fields):
+        self.logs.append(SendLog(student=student, recipient_email=student.email, course=student.course, status=status, **fields))
+
+    def delivered(self, student, tpl, cert):
+        self.log(student, 'SUCCESS', attachment=cert.file.name)
+        self.deliveries.append(ledger.entry(student, tpl))
+
+    def save_certificates(self):
+        with transaction.atomic(), metrics.timed('db_certificate'):
+            Student.objects.bulk_update(list(self.students.values()), ['last_certificate', 'template'])
+            Certificate.objects.bulk_create(self.certificates)
+        if self.students:
+            listcache.bump('student')  # bulk_update skips post_save
+
+    def flush(self, items):
+        SendJobItem.objects.bulk_update(items, ['state', 'attempts', 'last_error', 'retry_after'])
+        with transaction.atomic(), metrics.timed('db_log'):
+            SendLog.objects.bulk_create(self.logs)
+            ledger.record(self.deliveries)
+        for item in items:
+            item.recorded = True  # whatever fails from here on must not log these again
+        stats.record_logs(self.logs)
+
+
+def retry_delay(attempts):
+    """Seconds a failed item waits before its next try: CERT_SEND_RETRY_BACKOFF, doubled per attempt."""
+    return _setting('CERT_SEND_RETRY_BACKOFF', 30) * 2 ** max(attempts - 1, 0)
+
+
+def _fail(item, error, writes):
+    item.last_error = str(error)
+    if item.attempts >= _setting('CERT_SEND_MAX_ATTEMPTS', 3):
+        writes.log(item.student, 'ERROR', error_reason=str(error))
+        item.state = 'ERROR'
+    else:
+        item.state = 'PENDING'
+        item.retry_after = timezone.now() + timedelta(seconds=retry_delay(item.attempts))
+
+
+def _plan(items):
+    """Count the attempt and pick each item's template and render task; failures go on item.error."""
+    templates = course_templates(item.student.course for item in items if not item.student.template_id)
+    for item in items:
+        item.attempts += 1
+        item.error = item.task = item.path = item.certificate = item.message = None
+        item.sent = item.recorded = False
+        try:
+            item.template = pick_template(item.student, templates)
+            item.task = render_task(item.student, item.template)
+        except Exception as e:
+            item.error = e
+    return items
+
+
+def _persist(items):
+    # certificate rows are saved before any email goes out
+    writes = _Writes()
+    for item in items:
+        if item.error is None:
+            try:
+                item.certificate = writes.certificate(item.student, item.template, item.path)
+                item.message = certificate_email(item.student, item.certificate.file.path)
+            except Exception as e:
+                item.error = e
+    writes.save_certificates()
+    return items
+
+
+def _sent(item, error):
+    item.error, item.sent = error, error is None
+    item.message = None  # drop the attachment bytes as soon as they are sent
+
+
+def _record(items, error=None):
+    """Write each item's outcome, its log row and ledger entry. `error` stands in for items that got neither."""
+    writes = _Writes()
+    for item in items:
+        if item.sent:
+            writes.delivered(item.student, item.template, item.certificate)
+            item.state, item.last_error = 'SUCCESS', ''
+        else:
+            _fail(item, item.error or error, writes)
+    writes.flush(items)
+    return items
+
+
+def process_items(items, use_async=None):
+    """Render the batch in the worker pool, save the certificates, email them, then record the outcome."""
+    _plan(items)
+    planned = [item for item in items if item.error is None]
+    for item, path in zip(planned, render_many([item.task for item in planned])):
+        item.path, item.error = (None, path) if isinstance(path, Exception) else (path, None)
+    _persist(items)
+
+    # one SMTP session per CERT_EMAIL_BATCH_SIZE messages, or several concurrent ones
+    ready = [item for item in items if item.error is None]
+    outgoing = [item.message for item in ready]
+    if use_async is None:
+        use_async = _setting('CERT_EMAIL_ASYNC', False)
+    results = async_delivery.deliver(outgoing) if use_async else Mailer().send(outgoing)
+    for item, (_, error) in zip(ready, results):
+        _sent(item, error)
+    return _record(items)
+
+
+def finish_jobs(job_ids):
+    # jobs with nothing left to claim are done
+    open_jobs = (SendJobItem.objects.filter(job_id__in=job_ids, state__in=['PENDING', 'CLAIMED'])
+                 .values_list('job_id', flat=True).distinct())
+    SendJob.objects.filter(id__in=job_ids).exclude(id__in=list(open_jobs)).exclude(status='DONE') \
+        .update(status='DONE', finished_at=timezone.now())
+
+
+def run_batch(size=None, use_async=None):
+    """Claim and process one batch; returns the number of items handled."""
+    items = claim_batch(size)
+    try:
+        process_items(items, use_async)
+    finally:
+        finish_jobs({item.job_id for item in items})
+    return len(items)
+
+
+# The pipeline runs the same steps as process_items, one stage each, on items
+# flowing through bounded queues instead of a whole batch at a time.
+
+def _claimed_items(size):
+    # pipeline source: claim batches until the queue is empty
+    while items := claim_batch(size):
+        yield from _plan(items)
+
+
+def _render_stage(state, item):
+    if item.error is None:
+        try:
+            item.path = render_one(item.task)
+        except Exception as e:
+            item.error = e
+    return item
+
+
+def _persist_stage(state, items):
+    return _persist(items)
+
+
+def _deliver_setup():
+    return Mailer()
+
+
+def _deliver_stage(mailer, item, limiter=None):
+    if item.error is None:
+        if limiter is not None:
+            limiter.wait(async_delivery.domain_of(item.message))
+        _sent(item, mailer.send_one(item.message))
+    return item
+
+
+def _log_stage(state, items):
+    _record(items)
+    finish_jobs({item.job_id for item in items})
+    return items
+
+
+def _drop(items, error):
+    # a stage raised while holding these: settle them now instead of leaving them CLAIMED.
+    # The log stage can fail after its rows were written (rollup, finish_jobs); those items are done.
+    pending = [item for item in items if not item.recorded]
+    if pending:
+        _record(pending, error)
+    finish_jobs({item.job_id for item in items})
+
+
+def run_pipeline(size=None):
+    """Drain the queue through overlapping render -> persist -> deliver -> log stages.
+
+    Stages run concurrently with CERT_PIPELINE_*_WORKERS threads each and
+    exchange items over queues of CERT_PIPELINE_QUEUE_DEPTH, which bounds how
+    many rendered certificates are in flight. Items a failing stage call was
+    holding are recorded as delivered or failed like any other, then the error
+    is raised once the queue is drained. Returns the number of items handled.
+    """
+    limiter = async_delivery.DomainRateLimiter()
+    batch = _setting('CERT_PIPELINE_DB_BATCH', 100)
+    handled = []
+
+    def log(state, items):
+        _log_stage(state, items)
+        handled.extend(items)
+        return items
+
+    def drop(items, error):
+        _drop(items, error)
+        handled.extend(items)
+
+    stages = [
+        pipeline.Stage('render', _render_stage, workers=_setting('CERT_PIPELINE_RENDER_WORKERS', None) or worker_count(),
+                       on_error=drop),
+        pipeline.Stage('persist', _persist_stage, batch=batch, on_error=drop),
+        pipeline.Stage('deliver', lambda mailer, item: _deliver_stage(mailer, item, limiter),
+                       workers=_setting('CERT_PIPELINE_DELIVER_WORKERS', 4), setup=_deliver_setup, teardown=Mailer.close,
+                       on_error=drop),
+        pipeline.Stage('log', log, batch=batch, on_error=drop),
+    ]
+    errors = pipeline.run(_claimed_items(size), stages, depth=_setting('CERT_PIPELINE_QUEUE_DEPTH', 32))
+    if errors:
+        stage, error = errors[0]
+        raise RuntimeError(f"{len(errors)} pipeline stage call(s) failed, first in {stage}: {error!r}") from error
+    return len(handled)
+
+
+def job_progress(job):
+    counts = dict(job.items.values_list('state').annotate(n=Count('id')))
+    done = counts.get('SUCCESS', 0) + counts.get('ERROR', 0)
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'total': job.total,
+        'pending': counts.get('PENDING', 0) + counts.get('CLAIMED', 0),
+        'success': counts.get('SUCCESS', 0),
+        'error': counts.get('ERROR', 0),
+        'skipped': job.skipped,
+        'done': done,
+        'percent': int(done * 100 / job.total) if job.total else 100,
+    }
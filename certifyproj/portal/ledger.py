@@ -0,0 +1,51 @@
+"""
+Send-once ledger: which certificate contents each student has already received.
+
+The key is the certificate content key without the issue date (template
+file, name, course, layout and engine), so a re-run on a later day still
+counts as the same certificate. Successful deliveries are recorded by the
+send worker; enqueue() drops students whose current certificate is already
+in the ledger, or who are still waiting in an earlier job, unless the send
+is forced.
+"""
+from .delivery import course_templates, pick_template
+from .models import DeliveryLedger, SendJobItem
+from .utils import certificate_key
+
+
+def content_key(student, tpl):
+    return certificate_key(tpl.render_path, student.name, student.course, '')
+
+
+def entry(student, tpl):
+    return DeliveryLedger(student=student, template=tpl, content_key=content_key(student, tpl))
+
+
+def undelivered(students):
+    """The students (a list, templates loaded) whose current certificate is neither in the ledger nor queued.
+
+    Queued means an item of any job is still PENDING or CLAIMED. Two queries.
+    """
+    templates = course_templates(s.course for s in students if not s.template_id)
+    keys = {}
+    for s in students:
+        try:
+            tpl = pick_template(s, templates)
+            keys[s.sno] = (tpl.pk, content_key(s, tpl))
+        except (ValueError, OSError):
+            keys[s.sno] = None  # no usable template: the worker records the error
+    wanted = {key for _, key in filter(None, keys.values())}
+    delivered = set(
+        DeliveryLedger.objects.filter(student_id__in=list(keys), content_key__in=wanted)
+        .values_list('student_id', 'template_id', 'content_key')
+    ) if wanted else set()
+    queued = set(
+        SendJobItem.objects.filter(student_id__in=list(keys), state__in=['PENDING', 'CLAIMED'])
+        .values_list('student_id', flat=True)
+    )
+    return [s for s in students if s.sno not in queued and (keys[s.sno] is None or (s.sno, *keys[s.sno]) not in delivered)]
+
+
+def record(entries):
+    # a forced re-send of the same content is already recorded
+    DeliveryLedger.objects.bulk_create(entries, ignore_conflicts=True)
@@ -0,0 +1,67 @@
+"""
+Query-result cache for the students and templates list pages.
+
+Each model has a generation counter in the cache; list entries embed the
+generations they were built from, so bumping a counter (from the post_save /
+post_delete signals, or explicitly after bulk writes that skip signals)
+orphans every stale entry at once.
+
+The counters are bumped by whichever process writes (web workers, the send
+worker, management commands), so they only work in a cache every process
+shares. With a per-process backend (locmem, dummy) list caching stays off.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIX = 'portal:list'
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_timeout():
+    """Seconds a list page is cached for; 0 when caching is off or the cache isn't shared."""
+    if settings.CACHES.get('default', {}).get('BACKEND') in LOCAL_BACKENDS:
+        return 0
+    return getattr(settings, 'CERT_LIST_CACHE_TIMEOUT', 300)
+
+
+def _gen_key(model):
+    return f'{PREFIX}:gen:{model}'
+
+
+def generation(model):
+    key = _gen_key(model)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, 1, timeout=None)
+        value = cache.get(key, 1)
+    return value
+
+
+def bump(*models):
+    """Invalidate every cached list built from these models ('student', 'template')."""
+    if not cache_timeout():
+        return
+    for model in models:
+        try:
+            cache.incr(_gen_key(model))
+        except ValueError:
+            cache.add(_gen_key(model), 2, timeout=None)
+
+
+def cached_list(name, depends_on, parts, build):
+    """Return build() for this list page, cached until a model it depends on changes."""
+    timeout = cache_timeout()
+    if not timeout:
+        return build()
+    gens = ':'.join(str(generation(m)) for m in depends_on)
+    digest = hashlib.md5('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    key = f'{PREFIX}:{name}:{gens}:{digest}'
+    result = cache.get(key)
+    if result is None:
+        result = build()
+        cache.set(key, result, timeout)
+    return result
@@ -0,0 +1,76 @@
+import smtplib, time
+from django.conf import settings
+from django.core.mail import get_connection
+
+from . import metrics
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_transient(error):
+    """Worth retrying on a fresh connection: drops, timeouts and 4xx replies."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        # refused recipients, missing extensions or auth support: the same on every try
+        return False
+    # SMTPException is an OSError too, so plain socket errors are only checked last
+    return isinstance(error, OSError)
+
+
+class Mailer:
+    """Sends many messages over one backend connection.
+
+    Messages go out in sessions of CERT_EMAIL_BATCH_SIZE; the connection is
+    reopened between sessions and after any drop. Transient failures are retried
+    up to CERT_EMAIL_MAX_RETRIES times with exponential backoff.
+    """
+
+    def __init__(self, batch_size=None, max_retries=None, backoff=None, connection=None):
+        self.batch_size = batch_size or _setting('CERT_EMAIL_BATCH_SIZE', 100)
+        self.max_retries = _setting('CERT_EMAIL_MAX_RETRIES', 3) if max_retries is None else max_retries
+        self.backoff = _setting('CERT_EMAIL_RETRY_BACKOFF', 1.0) if backoff is None else backoff
+        self.connection = connection
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+        # keep the connection open so send_messages() doesn't close it after each call
+        self.connection.open()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+    def send_one(self, message):
+        """Send one message on the shared connection; returns None or the final error."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timed('smtp'):
+                    self.open()
+                    self.connection.send_messages([message])
+                return None
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    return e
+                self.close()
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def send(self, messages):
+        """Send all messages; returns a list of (message, error) in the same order."""
+        messages = list(messages)
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            try:
+                for message in messages[start:start + self.batch_size]:
+                    results.append((message, self.send_one(message)))
+            finally:
+                self.close()
+        return results
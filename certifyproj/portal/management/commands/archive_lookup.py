@@ -0,0 +1,25 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import archive
+
+
+class Command(BaseCommand):
+    help = "Print an archived row by table and id, or every archived row of one day."
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(archive.TABLES))
+        parser.add_argument('id', type=int, nargs='?')
+        parser.add_argument('--day', help="YYYY-MM-DD: print that day's partition instead")
+
+    def handle(self, *args, **opts):
+        if opts['day']:
+            for row in archive.iter_partition(opts['table'], opts['day']):
+                self.stdout.write(json.dumps(row))
+            return
+        if opts['id'] is None:
+            raise CommandError("Give an id or --day.")
+        row = archive.lookup(opts['table'], opts['id'])
+        if row is None:
+            raise CommandError(f"No archived {opts['table']} row with id {opts['id']}.")
+        self.stdout.write(json.dumps(row, indent=2))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal import archive
+
+
+class Command(BaseCommand):
+    help = "Move SendLog, Certificate and report rows older than N days into gzipped JSONL partitions under MEDIA_ROOT/archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive rows older than this many days (default CERT_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--tables', nargs='+', choices=sorted(archive.TABLES), default=sorted(archive.TABLES))
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows moved per batch (default CERT_ARCHIVE_CHUNK_SIZE)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    def handle(self, *args, **opts):
+        days = opts['days'] if opts['days'] is not None else getattr(settings, 'CERT_ARCHIVE_AFTER_DAYS', 365)
+        before = timezone.localdate() - timedelta(days=days)
+        for table in opts['tables']:
+            if opts['dry_run']:
+                self.stdout.write(f"{table}: {archive.pending(table, before)} rows before {before} would be archived.")
+                continue
+            moved = archive.archive_table(table, before, opts['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"{table}: archived {moved} rows before {before}."))
@@ -0,0 +1,78 @@
+import json, platform
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from portal import benchmarks
+
+STAGES = ('render', 'import', 'bulk_send', 'views')
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark rendering, import, bulk send, export and list views on a throwaway test database. "
+            "Run with --settings=certifyproj.test_settings (SQLite + locmem email).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', default=','.join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+        parser.add_argument('--import-sizes', type=int_list, default=[1000, 10000, 100000])
+        parser.add_argument('--send-count', type=int, default=200, help="Students in the bulk_send stage")
+        parser.add_argument('--view-rows', type=int, default=10000, help="Students/logs seeded for the view stages")
+        parser.add_argument('--no-alloc', action='store_true', help="Skip the tracemalloc pass")
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help="Previous results JSON; fail if a stage regressed")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown when comparing (0.2 = 20%%)")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Run benchmarks with --settings=certifyproj.test_settings.")
+        stages = [s for s in opts['stages'].split(',') if s]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown))}")
+        alloc = not opts['no_alloc']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        results = []
+        try:
+            if 'render' in stages:
+                results += benchmarks.bench_render(alloc)
+            if 'import' in stages:
+                results += benchmarks.bench_import(opts['import_sizes'], alloc)
+            if 'bulk_send' in stages:
+                results += benchmarks.bench_bulk_send(opts['send_count'], alloc)
+            if 'views' in stages:
+                results += benchmarks.bench_views(opts['view_rows'], alloc)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for r in results:
+            self.stdout.write(f"{benchmarks.result_key(r):<45} {r['per_call'] * 1000:>10.2f} ms"
+                              f" {r['queries']:>6} q {r.get('peak_kb', 0):>10.1f} KB")
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'render_workers': getattr(settings, 'CERT_RENDER_WORKERS', None),
+            'results': results,
+        }
+        with open(opts['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(results)} results to {opts['output']}"))
+
+        if opts['compare']:
+            with open(opts['compare']) as f:
+                previous = json.load(f)['results']
+            regressions = benchmarks.compare(results, previous, opts['threshold'])
+            for key, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f"REGRESSION {key}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} stage(s) regressed by more than {opts['threshold']:.0%}.")
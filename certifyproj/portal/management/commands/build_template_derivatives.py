@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from portal.models import Template
+from portal.utils import IMAGE_ERRORS, build_template_derivatives
+
+
+class Command(BaseCommand):
+    help = "Build the render-ready image and thumbnail for templates that don't have them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every template, not just missing ones")
+
+    def handle(self, *args, **opts):
+        qs = Template.objects.exclude(file='')
+        if not opts['all']:
+            qs = qs.filter(render_file='')
+        built = 0
+        for tpl in qs.order_by('sno'):
+            try:
+                build_template_derivatives(tpl)
+                built += 1
+            except IMAGE_ERRORS as e:
+                self.stderr.write(f"Template {tpl.sno} ({tpl.file.name}): {e}")
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {built} templates."))
@@ -0,0 +1,49 @@
+import os, time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portal.models import Certificate, SendLog, Student
+
+CERT_DIRS = ('certificates', 'sent_attachments')
+
+
+def referenced_files():
+    names = set()
+    for qs in (Certificate.objects.values_list('file', flat=True),
+               SendLog.objects.exclude(attachment='').values_list('attachment', flat=True),
+               Student.objects.exclude(last_certificate='').values_list('last_certificate', flat=True)):
+        names.update(name.replace('\\', '/') for name in qs.iterator(chunk_size=5000))
+    return names
+
+
+class Command(BaseCommand):
+    help = "Delete certificate PDFs under MEDIA_ROOT that no Certificate, SendLog or Student references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help="Skip files younger than this many seconds (renders not yet recorded)")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **opts):
+        media = Path(settings.MEDIA_ROOT)
+        keep = referenced_files()
+        cutoff = time.time() - opts['min_age']
+        removed = freed = 0
+        for sub in CERT_DIRS:
+            folder = media / sub
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder):
+                if not entry.is_file():
+                    continue
+                name = f"{sub}/{entry.name}"
+                st = entry.stat()
+                if name in keep or st.st_mtime > cutoff:
+                    continue
+                if not opts['dry_run']:
+                    os.remove(entry.path)
+                removed += 1
+                freed += st.st_size
+        verb = "Would remove" if opts['dry_run'] else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} files ({freed / 1024 / 1024:.1f} MB)."))
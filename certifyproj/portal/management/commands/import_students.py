@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from portal.importer import import_students
+
+
+class Command(BaseCommand):
+    help = "Import students from a CSV file (hallticket,name,course,email,phone)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, utf-8")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per bulk insert (default CERT_IMPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **opts):
+        with open(opts['path'], newline='', encoding='utf-8') as f:
+            summary = import_students(f, chunk_size=opts['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} new students, {summary['skipped']} skipped, {summary['invalid']} invalid."))
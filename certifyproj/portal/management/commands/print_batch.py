@@ -0,0 +1,28 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from portal.models import Student, Template
+from portal.pdfvector import write_pdf
+from portal.utils import iter_chunks
+
+
+class Command(BaseCommand):
+    help = "Write one multi-page vector PDF (one page per student) for a template, for printing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('template', type=int, help="Template sno")
+        parser.add_argument('--out', required=True, help="Output PDF path")
+        parser.add_argument('--date', default=None, help="Date printed on the certificates (default today, dd-mm-YYYY)")
+
+    def handle(self, *args, **opts):
+        try:
+            tpl = Template.objects.get(sno=opts['template'])
+        except Template.DoesNotExist:
+            raise CommandError(f"Template {opts['template']} does not exist.")
+        date_str = opts['date'] or date.today().strftime("%d-%m-%Y")
+        # students assigned this template, or unassigned ones on its course
+        students = Student.objects.filter(Q(template=tpl) | Q(template__isnull=True, course=tpl.course)).only('sno', 'name', 'course')
+        pages = ((s.name, s.course, date_str) for chunk in iter_chunks(students, 2000, key='sno') for s in chunk)
+        count = write_pdf(opts['out'], tpl.render_path, pages)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} pages to {opts['out']}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from portal.deletion import purge_pending_files
+
+
+class Command(BaseCommand):
+    help = "Remove certificate files queued by student deletes (the send worker also does this when idle)."
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            handled = purge_pending_files()
+            if not handled:
+                break
+            total += handled
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} queued files."))
@@ -0,0 +1,15 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+
+from portal import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per course per day DeliveryStat rollup from SendLog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, default=None, help="Only rebuild days on or after YYYY-MM-DD")
+
+    def handle(self, *args, **opts):
+        rows = stats.rebuild(since=opts['since'])
+        self.stdout.write(self.style.SUCCESS(f"Rollup rebuilt: {rows} course/day rows."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from portal.models import Student, StudentSearchToken
+from portal.search import index_students
+from portal.utils import iter_chunks
+
+
+class Command(BaseCommand):
+    help = "Rebuild the student search token table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        StudentSearchToken.objects.all().delete()
+        total = 0
+        for chunk in iter_chunks(Student.objects.all(), opts['chunk_size'], key='sno'):
+            index_students(chunk)
+            total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} students."))
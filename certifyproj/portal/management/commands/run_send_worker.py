@@ -0,0 +1,37 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portal import jobs
+from portal.deletion import purge_pending_files
+
+
+class Command(BaseCommand):
+    help = "Process queued certificate send jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Items claimed per batch (default CERT_SEND_BATCH_SIZE)")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+        parser.add_argument('--async-delivery', action='store_true', default=None,
+                            help="Send over CERT_EMAIL_SESSIONS concurrent SMTP sessions (default CERT_EMAIL_ASYNC)")
+        parser.add_argument('--pipeline', action='store_true', default=None,
+                            help="Overlap rendering, DB writes and SMTP in a staged pipeline (default CERT_PIPELINE)")
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Send worker {jobs.WORKER_ID} started.")
+        use_pipeline = opts['pipeline'] if opts['pipeline'] is not None else getattr(settings, 'CERT_PIPELINE', False)
+        while True:
+            if use_pipeline:
+                handled = jobs.run_pipeline(opts['batch_size'])
+            else:
+                handled = jobs.run_batch(opts['batch_size'], opts['async_delivery'])
+            if handled:
+                self.stdout.write(f"Processed {handled} items.")
+                continue
+            # idle: clear files freed by student deletes
+            if purge_pending_files():
+                continue
+            if opts['once']:
+                break
+            time.sleep(opts['sleep'])
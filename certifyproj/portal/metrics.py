@@ -0,0 +1,251 @@
+"""
+In-process histograms exposed in Prometheus text format.
+
+Each process (web workers, the send worker, render pool processes) records
+into its own registry. When CERT_METRICS_DIR is set the
+registry is also flushed there as <pid>-<random>.json every few seconds, and
+the metrics endpoint merges every file so send-worker stages show up next to
+request latencies.
+
+Files of processes that have exited, or that have not flushed for
+CERT_METRICS_MAX_AGE seconds, are folded into retired.json and removed, so the
+directory doesn't grow without bound and the merged counters never go
+backwards. A process whose file was retired while it sat idle carries on from
+the counts it had not flushed yet.
+"""
+import atexit, json, os, threading, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): files are never retired
+    fcntl = None
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNTS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+METRICS = {
+    'portal_stage_seconds': ('Time spent per certificate pipeline stage.', SECONDS),
+    'portal_request_seconds': ('View latency.', SECONDS),
+    'portal_request_queries': ('Database queries per request.', COUNTS),
+}
+
+FLUSH_INTERVAL = 5.0
+RETIRED = 'retired.json'
+
+_lock = threading.Lock()
+_data = {}  # (name, labels) -> [bucket counts..., +Inf count], sum, count
+_owner = os.getpid()
+_name = None  # this process's file, once flushed; a reused PID never gets an old name
+_flushed = {}  # what that file holds
+_last_flush = 0.0
+
+
+def _metrics_dir():
+    path = getattr(settings, 'CERT_METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def _own_data():
+    # call with _lock held; a forked child starts from zero instead of its parent's counts
+    global _owner, _name, _flushed
+    if os.getpid() != _owner:
+        _data.clear()
+        _owner, _name, _flushed = os.getpid(), None, {}
+    return _data
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][1]
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        data = _own_data()
+        entry = data.get(key)
+        if entry is None:
+            entry = data[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        else:
+            entry[0][-1] += 1
+        entry[1] += value
+        entry[2] += 1
+    _maybe_flush()
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the block (or decorated function) under portal_stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('portal_stage_seconds', time.perf_counter() - start, stage=stage)
+
+
+def _snapshot():
+    with _lock:
+        return {k: [list(v[0]), v[1], v[2]] for k, v in _own_data().items()}
+
+
+def _merge(into, data):
+    for key, (counts, total, count) in data.items():
+        entry = into.setdefault(key, [[0] * len(counts), 0.0, 0])
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total
+        entry[2] += count
+
+
+def _rows(data):
+    return [[name, list(labels), *values] for (name, labels), values in data.items()]
+
+
+def _load(rows):
+    return {(name, tuple(tuple(pair) for pair in labels)): [counts, total, count]
+            for name, labels, counts, total, count in rows if name in METRICS}
+
+
+def _write(path, payload):
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(payload))
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _folder_lock(folder):
+    with open(folder / '.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # closing the file drops the lock
+
+
+def flush():
+    global _name, _flushed
+    folder = _metrics_dir()
+    if folder is None:
+        return
+    folder.mkdir(parents=True, exist_ok=True)
+    with _folder_lock(folder), _lock:
+        data = _own_data()
+        if _name is not None and not (folder / _name).exists():
+            # retired while idle: retired.json holds what was flushed, keep only the rest
+            for key, (counts, total, count) in _flushed.items():
+                entry = data[key]
+                entry[0] = [a - b for a, b in zip(entry[0], counts)]
+                entry[1] -= total
+                entry[2] -= count
+            _name = None
+        if _name is None:
+            _name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        _flushed = {k: [list(v[0]), v[1], v[2]] for k, v in data.items()}
+        _write(folder / _name, _rows(_flushed))
+
+
+def _maybe_flush():
+    global _last_flush
+    now = time.monotonic()
+    if _metrics_dir() is not None and now - _last_flush > FLUSH_INTERVAL:
+        _last_flush = now
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+atexit.register(lambda: _metrics_dir() and flush())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # exists, owned by someone else
+        return True
+    return True
+
+
+def _retire(folder):
+    """Fold the files of exited or long-silent processes into retired.json. Call with the folder lock held."""
+    max_age = getattr(settings, 'CERT_METRICS_MAX_AGE', 3600)
+    path = folder / RETIRED
+    try:
+        retired = json.loads(path.read_text())
+    except FileNotFoundError:
+        retired = {'files': [], 'rows': []}
+    # names already folded in; removing them may not have finished last time
+    done = [name for name in retired['files'] if (folder / name).exists()]
+    totals = _load(retired['rows'])
+    now = time.time()
+    for file in folder.glob('*.json'):
+        if file.name in (RETIRED, _name) or file.name in done:
+            continue
+        try:
+            pid = int(file.stem.split('-')[0])
+            stale = now - file.stat().st_mtime > max_age
+            if _alive(pid) and not stale:
+                continue
+            rows = json.loads(file.read_text())
+        except (OSError, ValueError):
+            continue
+        _merge(totals, _load(rows))
+        done.append(file.name)
+    _write(path, {'files': done, 'rows': _rows(totals)})
+    for name in done:
+        try:
+            (folder / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def collect():
+    """This process's histograms merged with those flushed by other processes (and retired ones)."""
+    folder = _metrics_dir()
+    if folder is None:
+        return _snapshot()
+    merged = {}
+    try:
+        flush()  # our own counts are read back from our file, so a retired file is never counted twice
+        with _folder_lock(folder):
+            if fcntl is not None:
+                _retire(folder)
+            for path in folder.glob('*.json'):
+                try:
+                    rows = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue
+                _merge(merged, _load(rows['rows'] if path.name == RETIRED else rows))
+    except OSError:
+        return _snapshot()
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+
+
+def render_prometheus():
+    data = collect()
+    lines = []
+    for name, (help_text, buckets) in METRICS.items():
+        series = sorted((labels, v) for (n, labels), v in data.items() if n == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, (counts, total, count) in series:
+            base = _labels(labels)
+            sep = ',' if base else ''
+            running = 0
+            for bound, n in zip(list(buckets) + ['+Inf'], counts):
+                running += n
+                lines.append(f'{name}_bucket{{{base}{sep}le="{bound}"}} {running}')
+            suffix = f'{{{base}}}' if base else ''
+            lines.append(f'{name}_sum{suffix} {total}')
+            lines.append(f'{name}_count{suffix} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+import json, logging, time
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger('portal.requests')
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class _MeasuredStream:
+    """Iterates a streaming response's content with the query counter installed, and reports once it's done."""
+
+    def __init__(self, content, counter, done):
+        self.chunks = iter(content)
+        self.counter = counter
+        self.done = done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            with connection.execute_wrapper(self.counter):
+                return next(self.chunks)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        done, self.done = self.done, None
+        if done:
+            done()
+
+
+class RequestMetricsMiddleware:
+    """Records view latency and query count per request, and optionally logs one JSON line.
+
+    Streaming responses (CSV exports, bulk zip downloads) run most of their
+    queries after the view returns, so they are measured until the stream is
+    finished or closed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        def record():
+            self.record(request, response, time.perf_counter() - start, counter.count)
+
+        # a FileResponse over an open file keeps its content as is, so servers can still sendfile() it
+        if response.streaming and not response.is_async and getattr(response, 'file_to_stream', None) is None:
+            response.streaming_content = _MeasuredStream(response.streaming_content, counter, record)
+        else:
+            record()
+        return response
+
+    def record(self, request, response, elapsed, queries):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe('portal_request_seconds', elapsed, view=view, method=request.method)
+        metrics.observe('portal_request_queries', queries, view=view)
+        if getattr(settings, 'CERT_METRICS_LOG_REQUESTS', False):
+            logger.info(json.dumps({
+                'view': view, 'method': request.method, 'path': request.path,
+                'status': response.status_code, 'ms': round(elapsed * 1000, 2), 'queries': queries,
+            }))
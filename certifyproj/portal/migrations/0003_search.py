@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX portal_student_fulltext ON portal_student (name, email, hallticket, course, phone)")
+
+
+def drop_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute("DROP INDEX portal_student_fulltext ON portal_student")
+
+
+def backfill_tokens(apps, schema_editor):
+    from portal.search import backend, tokenize, SEARCH_FIELDS
+    if backend() != 'tokens':
+        return
+    Student = apps.get_model('portal', 'Student')
+    StudentSearchToken = apps.get_model('portal', 'StudentSearchToken')
+    batch = []
+    for s in Student.objects.only(*SEARCH_FIELDS).iterator(chunk_size=2000):
+        batch.extend(StudentSearchToken(student_id=s.pk, token=t) for t in tokenize(*(getattr(s, f) for f in SEARCH_FIELDS)))
+        if len(batch) >= 5000:
+            StudentSearchToken.objects.bulk_create(batch)
+            batch = []
+    StudentSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0002_sendjob_sendjobitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['student', 'created_at'], name='portal_cert_student_87aa43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendlog',
+            index=models.Index(fields=['status', 'sent_at'], name='portal_send_status_ff5d15_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendlog',
+            index=models.Index(fields=['recipient_email'], name='portal_send_recipie_747954_idx'),
+        ),
+        migrations.AddField(
+            model_name='studentsearchtoken',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='portal.student'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsearchtoken',
+            index=models.Index(fields=['token', 'student'], name='portal_stud_token_cb8fe9_idx'),
+        ),
+        migrations.RunPython(add_fulltext, drop_fulltext),
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0003_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course', models.CharField(blank=True, max_length=120)),
+                ('day', models.DateField()),
+                ('sent', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('resent', models.IntegerField(default=0)),
+                ('downloaded', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='portal_deli_day_7ebf4c_idx')],
+                'unique_together': {('course', 'day')},
+            },
+        ),
+    ]
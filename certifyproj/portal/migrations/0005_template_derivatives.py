@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_deliverystat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='template',
+            name='render_file',
+            field=models.ImageField(blank=True, upload_to='templates/render/'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='templates/thumbs/'),
+        ),
+    ]
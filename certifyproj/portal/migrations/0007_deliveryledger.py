@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_pendingfiledeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendjob',
+            name='skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='DeliveryLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_key', models.CharField(max_length=64)),
+                ('delivered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='portal.student')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='portal.template')),
+            ],
+            options={
+                'unique_together': {('student', 'template', 'content_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_deliveryledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendjobitem',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_course(apps, schema_editor):
+    # rows written so far: the student's current course is the best record there is
+    SendLog = apps.get_model('portal', 'SendLog')
+    Student = apps.get_model('portal', 'Student')
+    SendLog.objects.filter(student__isnull=False).update(
+        course=Subquery(Student.objects.filter(sno=OuterRef('student_id')).values('course')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_sendjobitem_retry_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendlog',
+            name='course',
+            field=models.CharField(blank=True, max_length=120),
+        ),
+        migrations.RunPython(backfill_course, migrations.RunPython.noop),
+    ]
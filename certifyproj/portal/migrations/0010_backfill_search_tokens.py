@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def backfill_tokens(apps, schema_editor):
+    # the FULLTEXT backend used to skip the token table; it now reads it for short words,
+    # stopwords and the digit halves of halltickets
+    from portal.search import tokenize, SEARCH_FIELDS
+    Student = apps.get_model('portal', 'Student')
+    StudentSearchToken = apps.get_model('portal', 'StudentSearchToken')
+    batch = []
+    for s in Student.objects.filter(search_tokens__isnull=True).only(*SEARCH_FIELDS).iterator(chunk_size=2000):
+        batch.extend(StudentSearchToken(student_id=s.pk, token=t) for t in tokenize(*(getattr(s, f) for f in SEARCH_FIELDS)))
+        if len(batch) >= 5000:
+            StudentSearchToken.objects.bulk_create(batch)
+            batch = []
+    StudentSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_sendlog_course'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
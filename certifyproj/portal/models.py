@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
@@ -9,10 +10,18 @@ class Template(models.Model):
     file = models.ImageField(upload_to='templates/')
     course = models.CharField(max_length=120)
     template_type = models.CharField(max_length=20, choices=TEMPLATE_TYPES)
+    # derivatives built from `file` by portal.utils.build_template_derivatives
+    render_file = models.ImageField(upload_to='templates/render/', blank=True)
+    thumbnail = models.ImageField(upload_to='templates/thumbs/', blank=True)
 
     def __str__(self):
         return f"{self.name} ({self.course})"
 
+    @property
+    def render_path(self):
+        """Image the renderer should draw on: the normalized derivative when present."""
+        return self.render_file.path if self.render_file else self.file.path
+
 # In portal/models.py
 class Student(models.Model):
     sno = models.AutoField(primary_key=True)
@@ -39,16 +48,29 @@ class Student(models.Model):
         return f"{self.name} ({self.hallticket})"
 
 
+class StudentSearchToken(models.Model):
+    # portable search index: one row per normalized word of a student's searchable fields
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'student'])]
+
+
 class Certificate(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     template = models.ForeignKey(Template, on_delete=models.SET_NULL, null=True)
     file = models.FileField(upload_to='certificates/')
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=['student', 'created_at'])]
+
 class SendLog(models.Model):
     STATUS = [('SUCCESS','SUCCESS'), ('ERROR','ERROR')]
     student = models.ForeignKey(Student, null=True, blank=True, on_delete=models.SET_NULL)
     recipient_email = models.EmailField()
+    course = models.CharField(max_length=120, blank=True)  # the student's course when sent; the rollup bucket
     status = models.CharField(max_length=10, choices=STATUS)
     error_reason = models.TextField(blank=True)
     sent_at = models.DateTimeField(default=timezone.now)
@@ -56,6 +78,9 @@ class SendLog(models.Model):
     download_count = models.PositiveIntegerField(default=0)
     attachment = models.FileField(upload_to='sent_attachments/', blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['status', 'sent_at']), models.Index(fields=['recipient_email'])]
+
     def __str__(self):
         return f"{self.recipient_email} - {self.status} - {self.sent_at:%Y-%m-%d %H:%M}"
     
@@ -82,3 +107,74 @@ class ReportError(models.Model):
     def __str__(self):
         return f"❌ {self.student_name or 'Unknown'} - {self.error_message[:30]}"
 
+
+
+class SendJob(models.Model):
+    STATUS = [('PENDING','PENDING'), ('RUNNING','RUNNING'), ('DONE','DONE')]
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=10, choices=STATUS, default='PENDING')
+    total = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)  # selected students already holding this certificate
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job #{self.pk} - {self.status} ({self.total})"
+
+
+class SendJobItem(models.Model):
+    STATE = [('PENDING','PENDING'), ('CLAIMED','CLAIMED'), ('SUCCESS','SUCCESS'), ('ERROR','ERROR')]
+    job = models.ForeignKey(SendJob, on_delete=models.CASCADE, related_name='items')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    state = models.CharField(max_length=10, choices=STATE, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    retry_after = models.DateTimeField(null=True, blank=True)  # a failed item is not claimed again before this
+
+    class Meta:
+        indexes = [models.Index(fields=['state', 'id']), models.Index(fields=['job', 'state'])]
+
+    def __str__(self):
+        return f"Job #{self.job_id} / {self.student_id} - {self.state}"
+
+
+class DeliveryStat(models.Model):
+    # per course per day rollup of SendLog, kept current by portal.stats
+    course = models.CharField(max_length=120, blank=True)
+    day = models.DateField()
+    sent = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    resent = models.IntegerField(default=0)
+    downloaded = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('course', 'day')]
+        indexes = [models.Index(fields=['day'])]
+
+    def __str__(self):
+        return f"{self.course or '-'} {self.day}: {self.sent} sent, {self.failed} failed"
+
+
+class PendingFileDeletion(models.Model):
+    # media file (relative to MEDIA_ROOT) freed by a delete, removed later by the send worker
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+
+class DeliveryLedger(models.Model):
+    # certificate contents already delivered to a student; bulk sends skip these (see portal.ledger)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='deliveries')
+    template = models.ForeignKey(Template, on_delete=models.CASCADE)
+    content_key = models.CharField(max_length=64)
+    delivered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [('student', 'template', 'content_key')]
+
+    def __str__(self):
+        return f"{self.student_id} / {self.template_id} - {self.content_key[:12]}"
@@ -0,0 +1,119 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+SALT = 'portal.pagination'
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset, with opaque tokens for its neighbours."""
+
+    def __init__(self, object_list, next_token=None, prev_token=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_token is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode(values, direction):
+    if values is not None:
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    return signing.dumps({'k': values, 'd': direction}, salt=SALT, compress=True)
+
+
+def last_token():
+    """Token for the final page."""
+    return encode(None, 'prev')
+
+
+def decode(token, model, keys):
+    """Return (values, direction); bad or tampered tokens fall back to the first page."""
+    if not token:
+        return None, 'next'
+    try:
+        data = signing.loads(token, salt=SALT)
+        values = data['k']
+        if values is not None:
+            if len(values) != len(keys):
+                raise ValueError
+            values = [model._meta.get_field(k).to_python(v) for k, v in zip(keys, values)]
+        return values, 'prev' if data['d'] == 'prev' else 'next'
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+        return None, 'next'
+
+
+def _after(keys, values, ascending):
+    # (k1, k2, ...) strictly after (v1, v2, ...) in the given order
+    op = 'gt' if ascending else 'lt'
+    q = Q()
+    for i, key in enumerate(keys):
+        step = Q(**{f'{key}__{op}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key: prev_value})
+        q |= step
+    return q
+
+
+def _row_values(row, keys):
+    return [getattr(row, k) for k in keys]
+
+
+def keyset_page(qs, keys, token=None, per_page=10, descending=False):
+    """Fetch one page of qs ordered by `keys` (unique together) using a cursor token.
+
+    Costs one query of per_page + 1 rows however deep the page is; never counts.
+    """
+    keys = list(keys)
+    values, direction = decode(token, qs.model, keys)
+    forward = direction == 'next'
+    ascending = forward != descending
+    if values is not None:
+        qs = qs.filter(_after(keys, values, ascending))
+    rows = list(qs.order_by(*[k if ascending else f'-{k}' for k in keys])[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    if not rows:
+        return KeysetPage([])
+
+    started_mid_list = values is not None
+    has_next = more if forward else started_mid_list
+    has_prev = started_mid_list if forward else more
+    return KeysetPage(
+        rows,
+        next_token=encode(_row_values(rows[-1], keys), 'next') if has_next else None,
+        prev_token=encode(_row_values(rows[0], keys), 'prev') if has_prev else None,
+    )
+
+
+def approximate_count(model):
+    """Planner row estimate for a whole table (MySQL/PostgreSQL), or None where unavailable."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute("SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
@@ -0,0 +1,159 @@
+"""
+Vector-overlay certificate PDFs.
+
+The template image is embedded once as an image XObject (JPEG files are copied
+in as-is with DCTDecode, anything else is stored Flate-compressed) and the
+name, course and date are drawn on top as real Helvetica text. A file can hold
+any number of pages that all reference the same background object, which is
+what print batches use.
+
+Only the standard Helvetica font is used (no embedding), so text is limited to
+WinAnsi (Latin-1) characters; anything else prints as '?'.
+"""
+import os, threading, zlib
+from collections import OrderedDict
+from django.conf import settings
+from PIL import Image
+
+from . import metrics
+
+# Helvetica advance widths (1/1000 em) for WinAnsi 32..126
+_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+ASCENT = 0.718
+TEXT_GRAY = 20 / 255  # same ink as generate_certificate_image's (20, 20, 20)
+
+_cache_lock = threading.Lock()
+_images = OrderedDict()  # path -> (mtime_ns, image dict)
+MAX_CACHED_IMAGES = 8
+
+
+def _dpi():
+    return getattr(settings, 'CERT_PDF_DPI', 150)
+
+
+def _load_image(template_path):
+    """Return {'width', 'height', 'colorspace', 'filter', 'data'} for the template, cached by mtime."""
+    path = str(template_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        hit = _images.get(path)
+        if hit and hit[0] == mtime:
+            _images.move_to_end(path)
+            return hit[1]
+
+    with Image.open(path) as im:
+        if im.format == 'JPEG' and im.mode in ('RGB', 'L'):
+            with open(path, 'rb') as f:
+                data = f.read()
+            info = {'filter': 'DCTDecode', 'data': data,
+                    'colorspace': 'DeviceRGB' if im.mode == 'RGB' else 'DeviceGray'}
+        else:
+            rgb = im.convert('RGB')
+            info = {'filter': 'FlateDecode', 'data': zlib.compress(rgb.tobytes(), 6), 'colorspace': 'DeviceRGB'}
+        info['width'], info['height'] = im.size
+
+    with _cache_lock:
+        _images[path] = (mtime, info)
+        while len(_images) > MAX_CACHED_IMAGES:
+            _images.popitem(last=False)
+    return info
+
+
+def _encode_text(text):
+    raw = text.encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def text_width(raw, size):
+    return sum(_WIDTHS[b - 32] if 32 <= b <= 126 else 556 for b in raw) * size / 1000
+
+
+def _page_content(page_w, page_h, px_w, px_h, name, course, date_str):
+    """Content stream for one page, laid out like generate_certificate_image."""
+    scale = page_w / px_w
+    short = min(px_w, px_h)
+    ops = [f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q".encode(), f"{TEXT_GRAY:.3f} g".encode()]
+    for text, rel_size, rel_y in ((name, 0.06, 0.45), (f"Course: {course}", 0.045, 0.58), (f"Date: {date_str}", 0.035, 0.67)):
+        size = int(short * rel_size) * scale
+        raw = _encode_text(text)
+        x = (page_w - text_width(text.encode('cp1252', errors='replace'), size)) / 2
+        # Pillow positions the top of the line; PDF positions the baseline
+        y = page_h - int(px_h * rel_y) * scale - ASCENT * size
+        ops.append(b"BT /F1 %.2f Tf %.2f %.2f Td (" % (size, x, y) + raw + b") Tj ET")
+    return b"\n".join(ops)
+
+
+class _Writer:
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.pos = 0
+
+    def raw(self, data):
+        self.f.write(data)
+        self.pos += len(data)
+
+    def obj(self, num, body, stream=None):
+        self.offsets[num] = self.pos
+        self.raw(b"%d 0 obj\n" % num)
+        if stream is None:
+            self.raw(body + b"\nendobj\n")
+        else:
+            self.raw(body + b"\nstream\n")
+            self.raw(stream)
+            self.raw(b"\nendstream\nendobj\n")
+
+
+def write_pdf(out_path, template_path, pages):
+    """Write a PDF with one page per (name, course, date_str) in `pages`, all sharing one background.
+
+    `pages` may be any iterable (e.g. a generator over a queryset); pages are
+    written as they are consumed. Returns the number of pages written.
+    """
+    img = _load_image(template_path)
+    scale = 72.0 / _dpi()
+    page_w, page_h = img['width'] * scale, img['height'] * scale
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    kids = []
+    with open(tmp_path, 'wb') as f:
+        w = _Writer(f)
+        w.raw(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        w.obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        w.obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        w.obj(4, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s /BitsPerComponent 8 /Filter /%s /Length %d >>"
+              % (img['width'], img['height'], img['colorspace'].encode(), img['filter'].encode(), len(img['data'])),
+              img['data'])
+        num = 5
+        for name, course, date_str in pages:
+            content = zlib.compress(_page_content(page_w, page_h, img['width'], img['height'], name, course, date_str))
+            w.obj(num + 1, b"<< /Length %d /Filter /FlateDecode >>" % len(content), content)
+            w.obj(num, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im0 4 0 R >> >> >>" % (page_w, page_h, num + 1))
+            kids.append(num)
+            num += 2
+        w.obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+
+        xref_pos = w.pos
+        w.raw(b"xref\n0 %d\n0000000000 65535 f \n" % num)
+        for i in range(1, num):
+            w.raw(b"%010d 00000 n \n" % w.offsets[i])
+        w.raw(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (num, xref_pos))
+    os.replace(tmp_path, out_path)
+    return len(kids)
+
+
+@metrics.timed('pdf_encode')
+def save_certificate_vector(template_path, student_name, course, date_str, out_dir, file_stem):
+    """Single-certificate counterpart of generate_certificate_image + save_certificate."""
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"{file_stem}.pdf")
+    write_pdf(out_path, template_path, [(student_name, course, date_str)])
+    return out_path
@@ -0,0 +1,110 @@
+"""
+Bounded multi-stage pipeline on threads.
+
+Stages are connected by queues of at most `depth` items, so a fast stage
+blocks (backpressure) instead of piling work up in memory, and the stages
+run at the same time: throughput approaches that of the slowest stage
+rather than the sum of all of them. Each stage has its own worker count;
+a stage with `batch` > 1 receives lists of whatever is already queued (up
+to `batch` items), which lets database stages write in bulk.
+"""
+import queue, threading
+from django.db import connections
+
+_DONE = object()
+
+
+class Stage:
+    """One step: `workers` threads applying func(state, item) and passing the result on.
+
+    `setup()` runs once per thread and its return value is that thread's
+    `state`; `teardown(state)` runs when the thread finishes. A batched stage's
+    func gets and returns a list. When func raises, `on_error(items, error)`
+    gets the items the call was holding, which go no further.
+    """
+
+    def __init__(self, name, func, workers=1, batch=1, setup=None, teardown=None, on_error=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.batch = max(1, batch)
+        self.setup = setup
+        self.teardown = teardown
+        self.on_error = on_error
+
+
+def _take(inbox, batch):
+    # block for the first item, then drain what is already waiting
+    first = inbox.get()
+    if batch == 1 or first is _DONE:
+        return first, []
+    rest = []
+    while len(rest) < batch - 1:
+        try:
+            item = inbox.get_nowait()
+        except queue.Empty:
+            break
+        if item is _DONE:
+            inbox.put(item)  # leave it for this or a sibling worker's next take
+            break
+        rest.append(item)
+    return first, rest
+
+
+def _worker(stage, inbox, outbox, errors):
+    state = stage.setup() if stage.setup else None
+    try:
+        while True:
+            first, rest = _take(inbox, stage.batch)
+            if first is _DONE:
+                inbox.put(_DONE)  # for the sibling workers
+                return
+            held = [first] + rest
+            try:
+                results = [stage.func(state, first)] if stage.batch == 1 else stage.func(state, held)
+            except Exception as e:
+                errors.append((stage.name, e))
+                if stage.on_error:
+                    try:
+                        stage.on_error(held, e)
+                    except Exception as handler_error:
+                        errors.append((stage.name, handler_error))
+                continue
+            if outbox is not None:
+                for result in results:
+                    outbox.put(result)
+    finally:
+        if stage.teardown:
+            stage.teardown(state)
+        connections.close_all()  # this thread's own DB connections
+
+
+def run(source, stages, depth=32):
+    """Feed every item of `source` through `stages` in order; returns [(stage name, exception)] for crashed calls.
+
+    Stage functions are expected to record per-item failures on the item and
+    pass it along; an exception escaping a stage drops what it was holding
+    (after handing it to the stage's on_error) and the other items carry on.
+    """
+    inboxes = [queue.Queue(maxsize=depth) for _ in stages]
+    errors = []
+    groups = []
+    for i, stage in enumerate(stages):
+        outbox = inboxes[i + 1] if i + 1 < len(stages) else None
+        threads = [threading.Thread(target=_worker, args=(stage, inboxes[i], outbox, errors),
+                                    name=f"pipeline-{stage.name}-{n}", daemon=True)
+                   for n in range(stage.workers)]
+        for t in threads:
+            t.start()
+        groups.append(threads)
+
+    try:
+        for item in source:
+            inboxes[0].put(item)
+    finally:
+        # shut stages down in order so each drains what the previous one produced
+        for i, threads in enumerate(groups):
+            inboxes[i].put(_DONE)
+            for t in threads:
+                t.join()
+    return errors
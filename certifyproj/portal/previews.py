@@ -0,0 +1,100 @@
+"""
+Downscaled certificate previews with a size-bounded disk cache.
+
+A preview is keyed on certificate_key() (template file digest, name, course,
+date, layout version) plus format and width, so editing the template or the
+student makes a new key and stale previews simply age out. Hits bump the
+file's mtime; once the cache grows past CERT_PREVIEW_CACHE_BYTES the least
+recently used files are removed. Nothing here touches SMTP or SendLog.
+
+Previews are always drawn by the raster renderer (generate_certificate_image),
+whatever CERT_PDF_ENGINE says. With the 'vector' engine the PDF that is sent
+sets the same lines in Helvetica instead of DejaVu Sans, so letter shapes and
+widths differ slightly, and characters outside Latin-1 print as '?' in the PDF.
+"""
+import hashlib, io, os, threading
+from datetime import date
+from pathlib import Path
+from django.conf import settings
+from PIL import features
+
+from .utils import certificate_key, generate_certificate_image
+
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+EVICT_EVERY = 50  # new previews written between cache size checks
+
+_lock = threading.Lock()
+_writes = 0
+
+
+def cache_dir():
+    return Path(getattr(settings, 'CERT_PREVIEW_DIR', None) or Path(settings.MEDIA_ROOT) / 'previews')
+
+
+def pick_format(accept):
+    return 'webp' if 'image/webp' in (accept or '') and features.check('webp') else 'jpeg'
+
+
+def preview_key(template_path, name, course, fmt, width):
+    today = date.today().strftime("%d-%m-%Y")
+    base = certificate_key(template_path, name, course, today)
+    return hashlib.sha256(f"{base}:{fmt}:{width}".encode('utf-8')).hexdigest()[:32]
+
+
+def get_preview(template_path, name, course, fmt, width, key=None):
+    """Path of the cached preview, rendering it first on a miss."""
+    key = key or preview_key(template_path, name, course, fmt, width)
+    path = cache_dir() / key[:2] / f"{key}.{fmt}"
+    try:
+        os.utime(path)  # LRU: a hit makes the file recent again
+        return path
+    except FileNotFoundError:
+        pass
+    im = generate_certificate_image(template_path, name, course, date.today().strftime("%d-%m-%Y"))
+    im.thumbnail((width, width))
+    buf = io.BytesIO()
+    pil_format = FORMATS[fmt][0]
+    im.save(buf, pil_format, quality=80 if pil_format == 'WEBP' else 85)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(buf.getvalue())
+    os.replace(tmp, path)
+    _note_write()
+    return path
+
+
+def _note_write():
+    global _writes
+    with _lock:
+        _writes += 1
+        due = _writes % EVICT_EVERY == 1
+    if due:
+        evict()
+
+
+def evict(limit=None):
+    """Delete least recently used previews until the cache is under 90% of `limit` bytes."""
+    limit = limit if limit is not None else getattr(settings, 'CERT_PREVIEW_CACHE_BYTES', 200 * 1024 * 1024)
+    files = []
+    total = 0
+    for root, _, names in os.walk(cache_dir()):
+        for name in names:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+            total += st.st_size
+    if total <= limit:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= limit * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,135 @@
+import atexit, multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+
+from .utils import generate_certificate_image, save_certificate, pdf_engine
+from .pdfvector import save_certificate_vector
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_to_file(task):
+    """Render one certificate. `task` is (template_path, name, course, date_str, out_dir, file_stem); returns the PDF path.
+
+    An existing file with the same stem is reused (and its mtime refreshed):
+    stems embed certificate_key(), so it already holds exactly this certificate.
+    """
+    template_path, name, course, date_str, out_dir, file_stem = task
+    existing = os.path.join(out_dir, f"{file_stem}.pdf")
+    try:
+        os.utime(existing)  # mark it recently used, so purge_pending_files leaves it alone
+        return existing
+    except FileNotFoundError:
+        pass
+    if pdf_engine() == 'vector':
+        return save_certificate_vector(template_path, name, course, date_str, out_dir, file_stem)
+    im = generate_certificate_image(template_path, name, course, date_str)
+    return save_certificate(im, out_dir, file_stem)
+
+
+def _init_worker(settings_module):
+    # spawned workers start without Django configured
+    import django
+    from django.apps import apps
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    if not apps.ready:
+        django.setup()
+    # pool processes skip atexit; flush their stage timings on the way out instead
+    from multiprocessing.util import Finalize
+    from . import metrics
+    Finalize(None, metrics.flush, exitpriority=10)
+
+
+def worker_count():
+    workers = getattr(settings, 'CERT_RENDER_WORKERS', None)
+    return workers if workers is not None else (os.cpu_count() or 1)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=worker_count(),
+                # spawn, not fork: the pool is created lazily, possibly while another
+                # thread holds metrics._lock or utils._cache_lock, and a forked child
+                # would inherit those locks held forever
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'certifyproj.settings'),),
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    # a pool that lost a worker is broken for good; the next _get_pool() builds a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(task):
+    pool = _get_pool()
+    try:
+        return pool, pool.submit(render_to_file, task)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        pool = _get_pool()
+        return pool, pool.submit(render_to_file, task)
+
+
+def _result(pool, future):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def render_one(task):
+    """Render one task in the process pool (inline with fewer than two workers); raises on failure."""
+    if worker_count() < 2:
+        return render_to_file(task)
+    return _result(*_submit(task))
+
+
+def render_many(tasks):
+    """Render tasks across CERT_RENDER_WORKERS processes.
+
+    Returns one entry per task, in order: the PDF path, or the exception raised
+    while rendering it. With fewer than two workers everything runs inline.
+    """
+    tasks = list(tasks)
+    if worker_count() < 2 or len(tasks) < 2:
+        results = []
+        for task in tasks:
+            try:
+                results.append(render_to_file(task))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    # a task whose worker died comes back as BrokenProcessPool; the batch after it gets a fresh pool
+    futures = [_submit(task) for task in tasks]
+    results = []
+    for pool, fut in futures:
+        try:
+            results.append(_result(pool, fut))
+        except Exception as e:
+            results.append(e)
+    return results
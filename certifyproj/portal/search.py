@@ -0,0 +1,117 @@
+import re, unicodedata
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Func, Q
+
+from .models import Student, StudentSearchToken
+
+SEARCH_FIELDS = ('name', 'email', 'hallticket', 'course', 'phone')
+
+
+def _mark_ranges():
+    # combining marks (Unicode category M*): \w leaves out the vowel signs and
+    # viramas of Indic scripts, which would cut "राम" into "र" and "म"
+    ranges = []
+    for cp in range(0x300, 0x10000):
+        if unicodedata.category(chr(cp)).startswith('M'):
+            if ranges and ranges[-1][1] == cp - 1:
+                ranges[-1][1] = cp
+            else:
+                ranges.append([cp, cp])
+    return ''.join(f'\\u{a:04x}-\\u{b:04x}' for a, b in ranges)
+
+
+MARKS = _mark_ranges()
+TOKEN_RE = re.compile(rf'[\w{MARKS}]+')
+PART_RE = re.compile(rf'(?:[^\W\d]|[{MARKS}])+|\d+')
+MAX_TOKEN = StudentSearchToken._meta.get_field('token').max_length
+
+# InnoDB's defaults: innodb_ft_min_token_size and INNODB_FT_DEFAULT_STOPWORD
+FULLTEXT_MIN_TOKEN = 3
+FULLTEXT_STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la of on or that the this to was what when where who will with und www'.split())
+
+
+class Match(Func):
+    """MATCH(columns) AGAINST (query IN BOOLEAN MODE): the relevance, > 0 for matching rows.
+
+    Built from F() columns, so the table alias is right inside subqueries too.
+    """
+    function = 'MATCH'
+    output_field = FloatField()
+
+    def __init__(self, *columns, against):
+        super().__init__(*(F(c) for c in columns))
+        self.against = against
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return f"{sql} AGAINST (%s IN BOOLEAN MODE)", (*params, self.against)
+
+
+def backend():
+    """'fulltext' (MySQL FULLTEXT index) or 'tokens' (StudentSearchToken prefix table).
+
+    The token table is kept up to date either way: the FULLTEXT backend looks
+    up the words InnoDB can't answer for (see _fulltext_word) there.
+    """
+    choice = getattr(settings, 'CERT_SEARCH_BACKEND', 'auto')
+    if choice == 'auto':
+        return 'fulltext' if connection.vendor == 'mysql' else 'tokens'
+    return choice
+
+
+def tokenize(*values):
+    # "HT1001" -> ht1001, ht, 1001 so both halves of a hallticket are searchable
+    tokens = set()
+    for value in values:
+        for word in TOKEN_RE.findall((value or '').lower()):
+            tokens.add(word[:MAX_TOKEN])
+            tokens.update(part[:MAX_TOKEN] for part in PART_RE.findall(word))
+    return tokens
+
+
+def index_students(students):
+    """Rewrite search tokens for the given students."""
+    if not students:
+        return
+    with transaction.atomic():
+        StudentSearchToken.objects.filter(student__in=[s.pk for s in students]).delete()
+        StudentSearchToken.objects.bulk_create([
+            StudentSearchToken(student_id=s.pk, token=token)
+            for s in students
+            for token in tokenize(*(getattr(s, f) for f in SEARCH_FIELDS))
+        ], batch_size=1000)
+
+
+def _fulltext_word(word):
+    # InnoDB keeps a run of letters and digits as one word ("HT1001"), so "1001" is
+    # only found through the token table, as are short words and stopwords
+    return len(word) >= FULLTEXT_MIN_TOKEN and word not in FULLTEXT_STOPWORDS and not word.isdigit()
+
+
+def search_students(qs, q):
+    """Filter a Student queryset to rows matching every word of q (prefix match).
+
+    A query with no searchable word in it (only punctuation, say) matches nothing.
+    """
+    words = TOKEN_RE.findall(q.lower())
+    if not words:
+        return qs.none() if q.strip() else qs
+    if backend() == 'fulltext':
+        fulltext = [word for word in words if _fulltext_word(word)]
+        if fulltext:
+            against = ' '.join(f'+{word}*' for word in fulltext)
+            qs = qs.alias(search_rank=Match(*SEARCH_FIELDS, against=against)).filter(search_rank__gt=0)
+        words = [word for word in words if not _fulltext_word(word)]
+    for word in words:
+        qs = qs.filter(sno__in=StudentSearchToken.objects.filter(token__startswith=word[:MAX_TOKEN]).values('student_id'))
+    return qs
+
+
+def search_logs(qs, q):
+    """Filter a SendLog queryset by student match or recipient email prefix."""
+    if not q:
+        return qs
+    students = search_students(Student.objects.all(), q).values('sno')
+    return qs.filter(Q(student__in=students) | Q(recipient_email__istartswith=q))
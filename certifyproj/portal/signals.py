@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import listcache
+from .models import Student, Template
+from .search import SEARCH_FIELDS, index_students
+
+
+@receiver(post_save, sender=Student)
+def reindex_student(sender, instance, update_fields=None, **kwargs):
+    # saves that only touch non-searchable columns (e.g. last_certificate) keep their tokens
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_students([instance])
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_lists(sender, **kwargs):
+    listcache.bump('student')
+
+
+@receiver(post_save, sender=Template)
+@receiver(post_delete, sender=Template)
+def invalidate_template_lists(sender, **kwargs):
+    listcache.bump('template')
@@ -0,0 +1,108 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DeliveryStat, SendLog
+from .archive import archived_until
+
+COUNTERS = ('sent', 'failed', 'resent', 'downloaded')
+STATUS_COUNTER = {'SUCCESS': 'sent', 'ERROR': 'failed'}
+
+
+def log_key(log):
+    """(course, day) bucket a SendLog row belongs to: the course it was sent under, not the student's current one."""
+    return log.course, timezone.localdate(log.sent_at)
+
+
+def bump(course, day, **deltas):
+    updates = {name: F(name) + n for name, n in deltas.items() if n}
+    if not updates:
+        return
+    if DeliveryStat.objects.filter(course=course, day=day).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            DeliveryStat.objects.create(course=course, day=day, **deltas)
+    except IntegrityError:
+        # another writer created the row first
+        DeliveryStat.objects.filter(course=course, day=day).update(**updates)
+
+
+def record_logs(logs):
+    """Count freshly written SendLog rows."""
+    buckets = {}
+    for log in logs:
+        counts = buckets.setdefault(log_key(log), dict.fromkeys(COUNTERS, 0))
+        counts[STATUS_COUNTER[log.status]] += 1
+    for (course, day), counts in buckets.items():
+        bump(course, day, **counts)
+
+
+def record_change(log, old_status, resent=0):
+    """Account for a resend attempt on an existing row (status may have flipped)."""
+    deltas = {'resent': resent}
+    if old_status != log.status:
+        deltas[STATUS_COUNTER[old_status]] = -1
+        deltas[STATUS_COUNTER[log.status]] = 1
+    bump(*log_key(log), **deltas)
+
+
+def record_download(log):
+    bump(*log_key(log), downloaded=1)
+
+
+def _counts(log, sign=1):
+    # everything one SendLog row contributes to its bucket
+    counts = dict.fromkeys(COUNTERS, 0)
+    counts[STATUS_COUNTER[log.status]] = sign
+    counts['resent'] = sign * log.resend_count
+    counts['downloaded'] = sign * log.download_count
+    return counts
+
+
+def record_edit(old, new):
+    """Account for a row edited by hand (any field may have changed); `old` is None for a new row."""
+    if old is not None:
+        bump(*log_key(old), **_counts(old, -1))
+    bump(*log_key(new), **_counts(new))
+
+
+def forget_logs(logs):
+    """Take deleted SendLog rows out of the rollup."""
+    for log in logs:
+        bump(*log_key(log), **_counts(log, -1))
+
+
+def rebuild(since=None):
+    """Recompute the rollup from SendLog (all days, or days >= since).
+
+    Days whose logs were archived (portal.archive) keep their rollup rows as they are.
+    """
+    floor = archived_until('sendlog')
+    if floor and (since is None or since < floor):
+        since = floor
+    logs = SendLog.objects.all()
+    stats = DeliveryStat.objects.all()
+    if since:
+        logs = logs.filter(sent_at__date__gte=since)
+        stats = stats.filter(day__gte=since)
+    rows = (logs.annotate(day=TruncDate('sent_at'))
+            .values('course', 'day')
+            .annotate(sent=Count('id', filter=Q(status='SUCCESS')),
+                      failed=Count('id', filter=Q(status='ERROR')),
+                      resent=Coalesce(Sum('resend_count'), 0),
+                      downloaded=Coalesce(Sum('download_count'), 0))
+            .order_by())
+    with transaction.atomic():
+        stats.delete()
+        DeliveryStat.objects.bulk_create([
+            DeliveryStat(course=r['course'], day=r['day'], **{name: r[name] for name in COUNTERS})
+            for r in rows
+        ], batch_size=1000)
+    return DeliveryStat.objects.count()
+
+
+def totals(qs=None):
+    qs = DeliveryStat.objects.all() if qs is None else qs
+    return qs.aggregate(**{name: Coalesce(Sum(name), 0) for name in COUNTERS})
@@ -0,0 +1,92 @@
+"""
+A local SMTP stand-in for delivery tests.
+
+Runs a minimal asyncio SMTP server on its own event loop in a background
+thread and records what arrives, so the real Django SMTP backend (and the
+Mailer and async engine on top of it) can be exercised end to end.
+"""
+import asyncio, threading
+from django.test import override_settings
+
+
+class SMTPStandIn:
+    """Use as a context manager; `settings()` points EMAIL_* at it.
+
+    `delay` is how long the server takes to accept each message, `replies`
+    maps a recipient to the reply its RCPT TO gets (default "250 ok").
+    """
+
+    def __init__(self, delay=0.0, replies=None):
+        self.delay = delay
+        self.replies = replies or {}
+        self.messages = []  # (session number, [recipients])
+        self.sessions = 0
+        self.active = 0
+        self.peak = 0  # most sessions open at the same time
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        start = asyncio.start_server(self._session, '127.0.0.1', 0)
+        self.server = asyncio.run_coroutine_threadsafe(start, self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+    def settings(self):
+        return override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                 EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.port, EMAIL_HOST_USER='',
+                                 EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_TIMEOUT=5)
+
+    @property
+    def recipients(self):
+        return sorted(r for _, rcpts in self.messages for r in rcpts)
+
+    async def _session(self, reader, writer):
+        self.sessions += 1
+        number = self.sessions
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+
+        async def reply(line):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        try:
+            await reply("220 stand-in ESMTP")
+            rcpts = []
+            while line := await reader.readline():
+                command = line.decode().strip()
+                verb = command[:4].upper()
+                if verb == 'RCPT':
+                    address = command.split(':', 1)[1].strip().strip('<>')
+                    answer = self.replies.get(address, "250 ok")
+                    if answer.startswith('2'):
+                        rcpts.append(address)
+                    await reply(answer)
+                elif verb == 'DATA':
+                    await reply("354 end with <CRLF>.<CRLF>")
+                    while (await reader.readline()).rstrip(b'\r\n') != b'.':
+                        pass
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    self.messages.append((number, rcpts))
+                    await reply("250 queued")
+                elif verb == 'QUIT':
+                    await reply("221 bye")
+                    break
+                else:
+                    if verb in ('MAIL', 'RSET'):
+                        rcpts = []
+                    await reply("250 ok")
+        except ConnectionError:
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
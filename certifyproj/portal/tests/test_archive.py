@@ -0,0 +1,80 @@
+"""
+Archival: rows move into indexed day partitions, re-runs after a crash count nothing twice, and the rollup keeps archived days.
+"""
+import shutil, tempfile
+from datetime import timedelta
+from unittest import mock
+from django.db import DatabaseError
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import archive, stats
+from ..models import DeliveryStat, SendLog
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(CERT_ARCHIVE_DIR=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.today = timezone.localdate()
+        self.old, self.older = self.today - timedelta(days=9), self.today - timedelta(days=10)
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        # ids interleave the two old days, as logs of different courses do
+        days = [10, 9, 10, 9, 10, 0]
+        SendLog.objects.bulk_create(SendLog(recipient_email=f"a{i}@example.com", course='ARC', status='SUCCESS',
+                                            sent_at=noon - timedelta(days=d)) for i, d in enumerate(days))
+        self.ids = list(SendLog.objects.order_by('id').values_list('id', flat=True))
+        self.before = self.today - timedelta(days=5)
+
+    def archived_ids(self, day):
+        return [row['id'] for row in archive.iter_partition('sendlog', day)]
+
+    def assert_archived_once(self):
+        index = archive.load_index('sendlog')
+        self.assertEqual({day: part['rows'] for day, part in index['partitions'].items()},
+                         {self.older.isoformat(): 3, self.old.isoformat(): 2})
+        self.assertEqual(sorted(self.archived_ids(self.older)), [self.ids[i] for i in (0, 2, 4)])
+        self.assertEqual(sorted(self.archived_ids(self.old)), [self.ids[i] for i in (1, 3)])
+        self.assertEqual(list(SendLog.objects.values_list('id', flat=True)), [self.ids[5]])
+        self.assertEqual(archive.archived_until('sendlog'), self.before)
+
+    def test_archive_and_lookup(self):
+        self.assertEqual(archive.pending('sendlog', self.before), 5)
+        self.assertEqual(archive.archive_table('sendlog', self.before, chunk_size=2), 5)
+        self.assert_archived_once()
+        row = archive.lookup('sendlog', self.ids[3])
+        self.assertEqual((row['recipient_email'], row['course']), ('a3@example.com', 'ARC'))
+        self.assertIsNone(archive.lookup('sendlog', self.ids[5]))  # still in the table
+        self.assertIsNone(archive.lookup('sendlog', 10 ** 9))
+        self.assertEqual(archive.archive_table('sendlog', self.before, chunk_size=2), 0)
+        self.assert_archived_once()
+
+    def test_rerun_after_a_crash_before_the_delete(self):
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError("lost connection")):
+            with self.assertRaises(DatabaseError):
+                archive.archive_table('sendlog', self.before, chunk_size=2)
+        self.assertEqual(archive.load_index('sendlog')['partitions'][self.older.isoformat()]['rows'], 1)
+        self.assertEqual(archive.archive_table('sendlog', self.before, chunk_size=2), 5)
+        self.assert_archived_once()
+
+    def test_rerun_after_a_crash_before_the_index_save(self):
+        with mock.patch.object(archive, '_save_index', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                archive.archive_table('sendlog', self.before, chunk_size=2)
+        self.assertEqual(archive.load_index('sendlog')['partitions'], {})
+        self.assertEqual(archive.archive_table('sendlog', self.before, chunk_size=2), 5)
+        self.assert_archived_once()
+
+    def test_rebuild_keeps_archived_days(self):
+        stats.rebuild()
+        archive.archive_table('sendlog', self.before)
+        stats.rebuild()
+        self.assertEqual(dict(DeliveryStat.objects.values_list('day', 'sent')), {self.older: 3, self.old: 2, self.today: 1})
+        # asking for an earlier start doesn't reach below the archive either
+        stats.rebuild(since=self.older)
+        self.assertEqual(dict(DeliveryStat.objects.values_list('day', 'sent')), {self.older: 3, self.old: 2, self.today: 1})
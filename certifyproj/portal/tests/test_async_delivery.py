@@ -0,0 +1,77 @@
+"""
+Async delivery: concurrent SMTP sessions against a local stand-in, and per-domain pacing.
+"""
+import smtplib, threading, time
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, override_settings
+
+from ..async_delivery import DomainRateLimiter, deliver, domain_of
+from .smtp import SMTPStandIn
+
+
+def messages(*recipients):
+    return [EmailMessage("Your Certificate", "Attached.", to=[r]) for r in recipients]
+
+
+@override_settings(CERT_EMAIL_DOMAIN_RATE=0, CERT_EMAIL_RETRY_BACKOFF=0)
+class DeliverTests(SimpleTestCase):
+
+    def test_sessions_run_concurrently(self):
+        outgoing = messages(*(f"s{i}@example.com" for i in range(12)))
+        with SMTPStandIn(delay=0.05) as server, server.settings():
+            results = deliver(outgoing, sessions=3)
+        self.assertEqual([(m, e) for m, e in results], [(m, None) for m in outgoing])  # input order
+        self.assertEqual(server.recipients, sorted(f"s{i}@example.com" for i in range(12)))
+        self.assertEqual((server.sessions, server.peak), (3, 3))
+
+    @override_settings(CERT_EMAIL_BATCH_SIZE=2)
+    def test_sessions_restart_every_batch(self):
+        with SMTPStandIn() as server, server.settings():
+            results = deliver(messages(*(f"b{i}@example.com" for i in range(5))), sessions=1)
+        self.assertEqual([e for _, e in results], [None] * 5)
+        self.assertEqual([n for n, _ in server.messages], [1, 1, 2, 2, 3])
+
+    def test_a_rejected_recipient_fails_alone(self):
+        outgoing = messages("ok1@example.com", "nobody@example.com", "ok2@example.com")
+        with SMTPStandIn(replies={'nobody@example.com': "550 no such user"}) as server, server.settings():
+            results = deliver(outgoing, sessions=2)
+        errors = [e for _, e in results]
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], smtplib.SMTPRecipientsRefused)
+        self.assertIsNone(errors[2])
+        self.assertEqual(server.recipients, ['ok1@example.com', 'ok2@example.com'])
+
+    def test_domains_are_paced(self):
+        # 4 messages to one domain at 20/s need at least 3 gaps of 50 ms; the other domain is unpaced
+        outgoing = messages(*(f"p{i}@slow.example" for i in range(4)), "q@fast.example")
+        limiter = DomainRateLimiter(rate=0, rates={'slow.example': 20.0})
+        with SMTPStandIn() as server, server.settings():
+            start = time.monotonic()
+            results = deliver(outgoing, sessions=4, limiter=limiter)
+            elapsed = time.monotonic() - start
+        self.assertEqual([e for _, e in results], [None] * 5)
+        self.assertGreaterEqual(elapsed, 0.15)
+
+
+class DomainRateLimiterTests(SimpleTestCase):
+
+    def test_slots(self):
+        limiter = DomainRateLimiter(rate=10.0, rates={'slow.example': 2.0, 'free.example': 0})
+        delays = [limiter._delay(domain, 100.0) for domain in
+                  ('a.example', 'a.example', 'a.example', 'b.example', 'slow.example', 'slow.example', 'free.example', 'free.example')]
+        self.assertEqual([round(d, 3) for d in delays], [0, 0.1, 0.2, 0, 0, 0.5, 0, 0])
+        # once the clock passes the reserved slots there is nothing to wait for
+        self.assertEqual(limiter._delay('a.example', 101.0), 0)
+
+    def test_wait_from_threads(self):
+        limiter = DomainRateLimiter(rate=50.0)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait, args=('example.com',)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.08 - 0.005)
+
+    def test_domain_of(self):
+        self.assertEqual(domain_of(messages("A.Person@Example.COM")[0]), 'example.com')
@@ -0,0 +1,169 @@
+"""
+Query budgets for every portal URL.
+
+Each case runs at two data volumes and must stay within the same fixed number
+of queries at both, so an N+1 fails here with the SQL that ran.
+
+    python manage.py test portal --settings=certifyproj.test_settings
+"""
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import urls
+from ..benchmarks import make_template, students_csv
+from ..models import Student, Template, SendLog, Certificate, SendJob, SendJobItem, DeliveryStat
+from ..search import index_students
+
+VOLUMES = (5, 60)
+
+
+def templates_csv(rows):
+    lines = ['name,course,template_type'] + [f"Imported {i},IMP{i},landscape" for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+# list pages are measured uncached: a cache hit would hide the queries behind them
+@override_settings(CERT_LIST_CACHE_TIMEOUT=0, CERT_RENDER_WORKERS=1)
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        cls.template = make_template((400, 300), course='BUDGET')
+        cls.pdf = ContentFile(b'%PDF-1.4\n%%EOF\n', name='budget.pdf')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.serial = 0
+
+    def seed(self, n):
+        """Top every table a view reads up to `n` rows."""
+        missing = n - Student.objects.count()
+        if missing > 0:
+            students = []
+            for _ in range(missing):
+                self.serial += 1
+                students.append(Student(hallticket=f"Q{self.serial}", name=f"Student {self.serial}", course='BUDGET',
+                                        email=f"q{self.serial}@example.com", template=self.template,
+                                        last_certificate=self.attachment))
+            index_students(Student.objects.bulk_create(students))
+        for i in range(Template.objects.count(), n):
+            Template.objects.create(name=f"Extra {i}", course=f"EXTRA{i}", template_type='landscape', file=self.template.file.name)
+        snos = list(Student.objects.values_list('sno', flat=True)[:n])
+        now = timezone.now()
+        for status in ('SUCCESS', 'ERROR'):
+            existing = SendLog.objects.filter(status=status).count()
+            logs = [SendLog(student_id=sno, recipient_email=f"log{i}@example.com", course='BUDGET', status=status, sent_at=now - timedelta(minutes=i))
+                    for i, sno in enumerate(snos[existing:n], start=existing)]
+            for log in logs:
+                log.attachment.name = self.attachment
+            SendLog.objects.bulk_create(logs)
+        existing = Certificate.objects.count()
+        Certificate.objects.bulk_create(Certificate(student_id=sno, template=self.template, file=self.attachment) for sno in snos[existing:n])
+        existing = DeliveryStat.objects.count()
+        DeliveryStat.objects.bulk_create(DeliveryStat(course='BUDGET', day=now.date() - timedelta(days=i), sent=1) for i in range(existing, n))
+
+    @property
+    def attachment(self):
+        if not hasattr(self, '_attachment'):
+            log = SendLog(recipient_email='a@example.com', status='SUCCESS')
+            log.attachment.save('budget.pdf', self.pdf, save=False)
+            self._attachment = log.attachment.name
+        return self._attachment
+
+    def upload(self):
+        return SimpleUploadedFile('upload.png', self.template.file.open('rb').read(), 'image/png')
+
+    def first_student(self):
+        return Student.objects.order_by('sno').first()
+
+    def first_log(self, status='SUCCESS'):
+        return SendLog.objects.filter(status=status, student__isnull=False).order_by('id').first()
+
+    def job(self, n):
+        job = SendJob.objects.create(created_by=self.user, total=n)
+        SendJobItem.objects.bulk_create(SendJobItem(job=job, student_id=sno) for sno in Student.objects.values_list('sno', flat=True)[:n])
+        return job
+
+    def cases(self):
+        """(label, url name, budget, request(n) -> (method, path, data)) for every route.
+
+        Budgets include the session and user lookups. request(n) runs outside
+        the measured block, so it may query to pick its target.
+        """
+        student_post = lambda n: {'hallticket': f"NEW{n}", 'name': 'New Student', 'course': 'BUDGET',
+                                  'email': 'new@example.com', 'phone': '', 'template': self.template.pk}
+        return [
+            ('students', 'students', 4, lambda n: ('get', reverse('portal:students'), {})),
+            ('students search', 'students', 4, lambda n: ('get', reverse('portal:students'), {'q': 'student'})),
+            ('students import', 'students_import', 13, lambda n: ('post', reverse('portal:students_import'), {
+                'file': SimpleUploadedFile('students.csv', students_csv(n, prefix=f"I{n}x"), 'text/csv')})),
+            ('students export', 'students_export', 3, lambda n: ('get', reverse('portal:students_export'), {})),
+            ('student add form', 'student_add', 3, lambda n: ('get', reverse('portal:student_add'), {})),
+            ('student add', 'student_add', 10, lambda n: ('post', reverse('portal:student_add'), student_post(n))),
+            ('student edit', 'student_edit', 7, lambda n: ('post', reverse('portal:student_edit', args=[self.first_student().sno]), student_post(n))),
+            ('student delete', 'student_delete', 17, lambda n: ('get', reverse('portal:student_delete', args=[self.first_student().sno]), {})),
+            ('student preview', 'student_preview', 3, lambda n: ('get', reverse('portal:student_preview', args=[self.first_student().sno]), {})),
+            ('templates', 'templates_list', 4, lambda n: ('get', reverse('portal:templates_list'), {})),
+            ('template add form', 'template_add', 2, lambda n: ('get', reverse('portal:template_add'), {})),
+            ('template add', 'template_add', 4, lambda n: ('post', reverse('portal:template_add'), {
+                'name': f"Upload {n}", 'course': f"UP{n}", 'template_type': 'landscape', 'file': self.upload()})),
+            ('template edit form', 'template_edit', 3, lambda n: ('get', reverse('portal:template_edit', args=[self.template.pk]), {})),
+            ('template delete', 'template_delete', 7, lambda n: ('get', reverse('portal:template_delete', args=[
+                Template.objects.exclude(pk=self.template.pk).order_by('sno').first().pk]), {})),
+            ('template preview', 'template_preview', 3, lambda n: ('get', reverse('portal:template_preview', args=[self.template.pk]), {'format': 'jpeg'})),
+            ('templates import', 'templates_import', 4, lambda n: ('post', reverse('portal:templates_import'), {
+                'file': SimpleUploadedFile('templates.csv', templates_csv(n), 'text/csv')})),
+            ('templates export', 'templates_export', 3, lambda n: ('get', reverse('portal:templates_export'), {})),
+            ('reports', 'reports', 5, lambda n: ('get', reverse('portal:reports'), {})),
+            ('reports search', 'reports', 5, lambda n: ('get', reverse('portal:reports'), {'q': 'student'})),
+            ('reports stats', 'reports_stats', 4, lambda n: ('get', reverse('portal:reports_stats'), {'course': 'BUDGET'})),
+            ('log resend', 'log_resend', 5, lambda n: ('get', reverse('portal:log_resend', args=[self.first_log().pk]), {})),
+            ('log download', 'log_download', 5, lambda n: ('get', reverse('portal:log_download', args=[self.first_log().pk]), {})),
+            ('send single', 'send_single', 12, lambda n: ('get', reverse('portal:send_single', args=[self.first_student().sno]), {})),
+            ('bulk send selected', 'bulk_send', 14, lambda n: ('post', reverse('portal:bulk_send'), {
+                'ids[]': list(Student.objects.values_list('sno', flat=True)[:n])})),
+            # by now the import cases have added >100 students; SQLite splits that item INSERT in two
+            ('bulk send all', 'bulk_send', 14, lambda n: ('post', reverse('portal:bulk_send'), {'select_all': 'true'})),
+            ('bulk delete selected', 'bulk_delete', 16, lambda n: ('post', reverse('portal:bulk_delete'), {
+                'ids[]': list(Student.objects.values_list('sno', flat=True)[:n])})),
+            ('bulk delete all', 'bulk_delete', 16, lambda n: ('post', reverse('portal:bulk_delete'), {'select_all': 'true'})),
+            ('bulk download selected', 'bulk_download', 3, lambda n: ('post', reverse('portal:bulk_download'), {
+                'ids[]': list(Student.objects.values_list('sno', flat=True)[:n])})),
+            ('bulk download all', 'bulk_download', 3, lambda n: ('post', reverse('portal:bulk_download'), {'select_all': 'true'})),
+            ('job status', 'send_job_status', 4, lambda n: ('get', reverse('portal:send_job_status', args=[self.job(n).pk]), {})),
+            ('metrics', 'metrics', 2, lambda n: ('get', reverse('portal:metrics'), {})),
+        ]
+
+    def measure(self, request, n):
+        self.seed(n)
+        method, path, data = request(n)
+        mail.outbox = []
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, path)
+        return queries.captured_queries
+
+    def test_every_url_has_a_budget(self):
+        covered = {name for _, name, _, _ in self.cases()}
+        routes = {p.name for p in urls.urlpatterns}
+        self.assertEqual(routes - covered, set(), "add a query budget for these routes")
+
+    def test_query_budgets(self):
+        for label, name, budget, request in self.cases():
+            for n in VOLUMES:
+                with self.subTest(label, rows=n):
+                    queries = self.measure(request, n)
+                    if len(queries) > budget:
+                        sql = '\n'.join(f"  {i}. {q['sql'][:300]}" for i, q in enumerate(queries, 1))
+                        self.fail(f"{label} ({name}) ran {len(queries)} queries with {n} rows; budget is {budget}:\n{sql}")
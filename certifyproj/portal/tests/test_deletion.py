@@ -0,0 +1,87 @@
+"""
+Student deletes and the purge of the certificate files they free.
+"""
+import os
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import deletion
+from ..deletion import delete_students, purge_pending_files
+from ..models import Student, Certificate, SendLog, PendingFileDeletion
+from ..rendering import render_to_file
+
+
+def media_file(name, age=7200):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n%%EOF\n')
+    then = (timezone.now() - timedelta(seconds=age)).timestamp()
+    os.utime(path, (then, then))
+    return path
+
+
+@override_settings(CERT_DELETE_GRACE_SECONDS=60)
+class PurgeTests(TestCase):
+
+    def student(self, n, certificate=''):
+        return Student.objects.create(hallticket=f"D{n}", name=f"Del {n}", course='DEL', email=f"d{n}@example.com",
+                                      last_certificate=certificate)
+
+    def age_queue(self, seconds=120):
+        PendingFileDeletion.objects.update(created_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_delete_then_purge(self):
+        own, shared, logged = (media_file(f"certificates/{n}.pdf") for n in ('own', 'shared', 'logged'))
+        gone = self.student(1, 'certificates/own.pdf')
+        Certificate.objects.create(student=gone, file='certificates/shared.pdf')
+        Certificate.objects.create(student=gone, file='certificates/logged.pdf')
+        SendLog.objects.create(student=gone, recipient_email='d1@example.com', status='SUCCESS', attachment='certificates/logged.pdf')
+        # the same content-addressed file also belongs to another student
+        Certificate.objects.create(student=self.student(2), file='certificates/shared.pdf')
+
+        self.assertEqual(delete_students(Student.objects.filter(pk=gone.pk), chunk_size=1), 1)
+        self.assertEqual(PendingFileDeletion.objects.count(), 3)
+        self.assertEqual(purge_pending_files(), 0)  # queued less than the grace period ago
+        self.age_queue()
+        self.assertEqual(purge_pending_files(), 3)
+        self.assertEqual([os.path.exists(p) for p in (own, shared, logged)], [False, True, True])
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_recently_reused_file_is_kept(self):
+        path = media_file("certificates/HT9_abc.pdf")
+        PendingFileDeletion.objects.create(name='certificates/HT9_abc.pdf')
+        self.age_queue()
+        # a render picks the file up again; its reference is not committed yet
+        self.assertEqual(render_to_file(('unused.png', 'N', 'C', 'D', os.path.dirname(path), 'HT9_abc')), path)
+        purge_pending_files()
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(f"{path}.purging"))
+
+    def test_file_referenced_during_the_purge_is_kept(self):
+        path = media_file("certificates/race.pdf")
+        PendingFileDeletion.objects.create(name='certificates/race.pdf')
+        self.age_queue()
+        real = deletion._in_use
+        calls = []
+
+        def in_use(names):
+            calls.append(set(names))
+            if len(calls) == 2:
+                # another worker commits a reference between the two checks
+                Certificate.objects.create(student=self.student(3), file='certificates/race.pdf')
+            return real(names)
+
+        with mock.patch.object(deletion, '_in_use', in_use):
+            purge_pending_files()
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(os.path.exists(path))
+
+    def test_missing_files_are_dropped_from_the_queue(self):
+        PendingFileDeletion.objects.create(name='certificates/never-there.pdf')
+        self.age_queue()
+        self.assertEqual(purge_pending_files(), 1)
+        self.assertFalse(PendingFileDeletion.objects.exists())
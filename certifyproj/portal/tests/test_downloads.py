@@ -0,0 +1,127 @@
+"""
+Certificate downloads: conditional requests, byte ranges, proxy offload and streamed ZIPs.
+"""
+import io, os, shutil, tempfile, zipfile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..downloads import CHUNK_SIZE, serve_file, stream_zip
+
+DATA = bytes(range(256)) * 3
+
+
+def body(response):
+    content = b''.join(response.streaming_content)
+    response.close()
+    return content
+
+
+class ServeFileTests(SimpleTestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(DATA)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        request = self.factory.get('/download/', headers=headers)
+        return serve_file(request, self.path, 'HT1_certificate.pdf', 'application/pdf', media_name='certificates/x.pdf')
+
+    def test_whole_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body(response), DATA)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="HT1_certificate.pdf"')
+        self.assertTrue(response.counts_as_download)
+
+    def test_byte_ranges(self):
+        for header, start, end in (('bytes=0-9', 0, 9), ('bytes=100-199', 100, 199),
+                                   ('bytes=700-', 700, 767), ('bytes=-8', 760, 767), ('bytes=760-9999', 760, 767)):
+            with self.subTest(header):
+                response = self.serve(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f"bytes {start}-{end}/{len(DATA)}")
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(body(response), DATA[start:end + 1])
+                # only the range that starts the file counts as a download
+                self.assertEqual(response.counts_as_download, start == 0)
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(Range='bytes=768-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(DATA)}")
+        self.assertFalse(response.counts_as_download)
+
+    def test_malformed_range_sends_the_whole_file(self):
+        response = self.serve(Range='bytes=1-2,5-6')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body(response), DATA)
+
+    def test_if_range(self):
+        first = self.serve()
+        body(first)
+        for if_range in (first['ETag'], first['Last-Modified']):
+            with self.subTest(if_range=if_range):
+                response = self.serve(Range='bytes=10-19', **{'If-Range': if_range})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(body(response), DATA[10:20])
+        # the client holds another version: send it the whole current file
+        response = self.serve(Range='bytes=10-19', **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body(response), DATA)
+
+    def test_not_modified(self):
+        first = self.serve()
+        body(first)
+        for headers in ({'If-None-Match': first['ETag']}, {'If-Modified-Since': first['Last-Modified']}):
+            with self.subTest(headers=headers):
+                response = self.serve(**headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], first['ETag'])
+                self.assertFalse(response.counts_as_download)
+        response = self.serve(**{'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+        body(response)
+
+    def test_offload(self):
+        with override_settings(CERT_DOWNLOAD_OFFLOAD='x-accel-redirect', CERT_DOWNLOAD_ACCEL_PREFIX='/protected/'):
+            response = self.serve()
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/certificates/x.pdf')
+            self.assertEqual(response.content, b'')
+        with override_settings(CERT_DOWNLOAD_OFFLOAD='x-sendfile'):
+            self.assertEqual(self.serve()['X-Sendfile'], self.path)
+
+
+class StreamZipTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def file(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_zipfile_reads_the_stream(self):
+        big = os.urandom(CHUNK_SIZE * 2 + 123)  # spans several copy blocks
+        entries = [('HT1_certificate.pdf', self.file('a.pdf', DATA)),
+                   ('HT2_certificate.pdf', os.path.join(self.dir, 'gone.pdf')),
+                   ('HT3_certificate.pdf', self.file('b.pdf', big)),
+                   ('HT4_certificate.pdf', self.file('empty.pdf', b''))]
+        chunks = list(stream_zip(iter(entries)))
+        self.assertTrue(all(len(c) <= CHUNK_SIZE * 2 for c in chunks))
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ['HT1_certificate.pdf', 'HT3_certificate.pdf', 'HT4_certificate.pdf'])
+            self.assertEqual(archive.read('HT1_certificate.pdf'), DATA)
+            self.assertEqual(archive.read('HT3_certificate.pdf'), big)
+            self.assertEqual(archive.read('HT4_certificate.pdf'), b'')
+            self.assertEqual({i.compress_type for i in archive.infolist()}, {zipfile.ZIP_STORED})
+
+    def test_empty_selection_is_a_valid_archive(self):
+        with zipfile.ZipFile(io.BytesIO(b''.join(stream_zip([])))) as archive:
+            self.assertEqual(archive.namelist(), [])
@@ -0,0 +1,58 @@
+"""
+gc_certificates: only old files nothing references are deleted.
+"""
+import io, os, shutil, tempfile, time
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Certificate, SendLog, Student
+
+
+class GcCertificatesTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.student = Student.objects.create(hallticket='G1', name='Gc', course='GC', email='g@example.com',
+                                              last_certificate='certificates/last.pdf')
+        Certificate.objects.create(student=self.student, file='certificates/cert.pdf')
+        SendLog.objects.create(student=self.student, recipient_email='g@example.com', status='SUCCESS',
+                               attachment='sent_attachments/sent.pdf')
+        self.files = {name: self.file(name) for name in (
+            'certificates/last.pdf', 'certificates/cert.pdf', 'sent_attachments/sent.pdf',
+            'certificates/orphan.pdf', 'sent_attachments/orphan.pdf')}
+        self.files['certificates/fresh.pdf'] = self.file('certificates/fresh.pdf', age=60)
+
+    def file(self, name, age=7200):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4\n%%EOF\n')
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command('gc_certificates', *args, stdout=out)
+        return out.getvalue()
+
+    def remaining(self):
+        return sorted(name for name, path in self.files.items() if os.path.exists(path))
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertIn("Would remove 2 files", self.gc('--dry-run'))
+        self.assertEqual(len(self.remaining()), 6)
+
+    def test_removes_only_old_unreferenced_files(self):
+        self.assertIn("Removed 2 files", self.gc())
+        self.assertEqual(self.remaining(), ['certificates/cert.pdf', 'certificates/fresh.pdf',
+                                            'certificates/last.pdf', 'sent_attachments/sent.pdf'])
+
+    def test_min_age(self):
+        self.assertIn("Removed 3 files", self.gc('--min-age', '0'))
+        self.assertNotIn('certificates/fresh.pdf', self.remaining())
+        self.assertIn('certificates/cert.pdf', self.remaining())
@@ -0,0 +1,61 @@
+"""
+Student CSV import: the created / skipped / invalid summary.
+"""
+import io
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from ..benchmarks import make_template
+from ..importer import import_students
+from ..models import Student
+from ..search import search_students
+
+CSV = """hallticket,name,course,email,phone
+HT1,Asha,CSE,asha@example.com,9000000001
+HT2,Ravi,ECE,,9000000002
+HT1,Asha Again,CSE,asha2@example.com,
+HT3,Bad Email,CSE,not-an-email,
+,No Hallticket,CSE,x@example.com,
+HT9,A,CSE,a@b.c,1,EXTRA
+HT4,Short Row
+HT5,Last,CSE,last@example.com,
+"""
+
+
+class ImportStudentsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = make_template((200, 150), course='CSE')
+        Student.objects.create(hallticket='HT5', name='Existing', course='CSE', email='e@example.com')
+
+    def test_summary(self):
+        summary = import_students(io.StringIO(CSV), chunk_size=2)
+        # HT1 repeats in the file and HT5 exists; HT3, the blank hallticket and the 6-field row are invalid
+        self.assertEqual(summary, {'created': 3, 'skipped': 2, 'invalid': 3})
+        self.assertEqual(list(Student.objects.values_list('hallticket', flat=True)), ['HT5', 'HT1', 'HT2', 'HT4'])
+
+    def test_rows_are_cleaned_and_linked(self):
+        import_students(io.StringIO(CSV))
+        asha, ravi, short = (Student.objects.get(hallticket=h) for h in ('HT1', 'HT2', 'HT4'))
+        self.assertEqual((asha.name, asha.template_id), ('Asha', self.template.pk))
+        self.assertEqual((ravi.email, ravi.template_id), ('HT2@example.com', None))
+        self.assertEqual((short.name, short.course, short.phone), ('Short Row', '', ''))
+        self.assertEqual(list(search_students(Student.objects.all(), 'asha')), [asha])
+
+    def test_header_is_case_and_space_insensitive(self):
+        summary = import_students(io.StringIO(" HallTicket , Name ,COURSE\nHT7, Spaced ,CSE\n"))
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(Student.objects.get(hallticket='HT7').name, 'Spaced')
+
+    def test_upload_reports_the_summary(self):
+        user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('students.csv', CSV.encode('utf-8'), 'text/csv')
+        response = self.client.post(reverse('portal:students_import'), {'file': upload})
+        self.assertRedirects(response, reverse('portal:students'), fetch_redirect_response=False)
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)],
+                         ["Imported 3 new students (2 already existed, 3 invalid rows)."])
@@ -0,0 +1,91 @@
+"""
+Send queue: claiming, stale reclaim, retry backoff, final ERROR marking and write failures.
+"""
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import jobs
+from ..benchmarks import make_template
+from ..models import Student, SendJobItem, SendLog
+
+
+@override_settings(CERT_RENDER_WORKERS=1, CERT_SEND_MAX_ATTEMPTS=2, CERT_SEND_RETRY_BACKOFF=30)
+class SendQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = make_template((200, 150), course='JOBS')
+
+    def student(self, n, course='JOBS'):
+        return Student.objects.create(hallticket=f"J{n}", name=f"Jobs {n}", course=course, email=f"j{n}@example.com")
+
+    def queue(self, *students):
+        return jobs.enqueue([s.sno for s in students], force=True)
+
+    def test_claim_marks_items_and_starts_the_job(self):
+        job = self.queue(self.student(1), self.student(2))
+        items = jobs.claim_batch(10, worker='w1')
+        self.assertEqual([(i.state, i.claimed_by) for i in items], [('CLAIMED', 'w1')] * 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertEqual(jobs.claim_batch(10, worker='w2'), [])
+
+    @override_settings(CERT_SEND_CLAIM_TIMEOUT=60)
+    def test_stale_claim_is_picked_up_again(self):
+        self.queue(self.student(1))
+        jobs.claim_batch(10, worker='w1')
+        SendJobItem.objects.update(claimed_at=timezone.now() - timedelta(seconds=30))
+        self.assertEqual(jobs.claim_batch(10, worker='w2'), [])
+        SendJobItem.objects.update(claimed_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual([i.claimed_by for i in jobs.claim_batch(10, worker='w2')], ['w2'])
+
+    def test_success(self):
+        job = self.queue(self.student(1))
+        self.assertEqual(jobs.run_batch(), 1)
+        item = job.items.get()
+        self.assertEqual((item.state, item.attempts, item.last_error), ('SUCCESS', 1, ''))
+        self.assertEqual([m.to for m in mail.outbox], [['j1@example.com']])
+        self.assertEqual(SendLog.objects.get().status, 'SUCCESS')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual([jobs.retry_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+
+    def test_failed_item_waits_for_retry_after_then_errors(self):
+        job = self.queue(self.student(1, course='NO TEMPLATE'))
+        start = timezone.now()
+        jobs.run_batch()
+        item = job.items.get()
+        self.assertEqual((item.state, item.attempts), ('PENDING', 1))
+        self.assertIn('No template', item.last_error)
+        self.assertGreaterEqual(item.retry_after, start + timedelta(seconds=30))
+        self.assertEqual(jobs.claim_batch(10), [])
+        self.assertFalse(SendLog.objects.exists())
+
+        SendJobItem.objects.update(retry_after=timezone.now() - timedelta(seconds=1))
+        jobs.run_batch()
+        item.refresh_from_db()
+        self.assertEqual((item.state, item.attempts), ('ERROR', 2))
+        log = SendLog.objects.get()
+        self.assertEqual((log.status, log.recipient_email), ('ERROR', 'j1@example.com'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(CERT_SEND_CLAIM_TIMEOUT=0)
+    def test_failed_log_write_does_not_resend(self):
+        job = self.queue(self.student(1))
+        with mock.patch.object(SendLog.objects, 'bulk_create', side_effect=DatabaseError('log table locked')):
+            with self.assertRaises(DatabaseError):
+                jobs.run_batch()
+        # the email went out and the item says so; nothing is left to claim
+        self.assertEqual(job.items.get().state, 'SUCCESS')
+        self.assertEqual(jobs.run_batch(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
@@ -0,0 +1,68 @@
+"""
+Send-once ledger: bulk re-runs skip delivered and still-queued students unless forced.
+"""
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from .. import jobs
+from ..benchmarks import bench_bulk_send, make_template
+from ..models import DeliveryLedger, Student, SendJobItem
+
+
+@override_settings(CERT_RENDER_WORKERS=1)
+class EnqueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = make_template((200, 150), course='LEDGER')
+
+    def setUp(self):
+        self.students = [Student.objects.create(hallticket=f"L{n}", name=f"Ledger {n}", course='LEDGER', email=f"l{n}@example.com")
+                         for n in range(3)]
+
+    def enqueue(self, force=False):
+        job = jobs.enqueue(Student.objects.all(), force=force)
+        return job.total, job.skipped
+
+    def test_rerun_while_queued_or_claimed_is_skipped(self):
+        self.assertEqual(self.enqueue(), (3, 0))
+        self.assertEqual(self.enqueue(), (0, 3))
+        jobs.claim_batch(2)
+        self.assertEqual(self.enqueue(), (0, 3))
+        self.assertEqual(SendJobItem.objects.count(), 3)
+
+    def test_rerun_after_delivery_is_skipped(self):
+        self.enqueue()
+        jobs.run_batch()
+        self.assertEqual(self.enqueue(), (0, 3))
+        self.assertEqual(jobs.run_batch(), 0)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_force_queues_everyone(self):
+        self.enqueue()
+        self.assertEqual(self.enqueue(force=True), (3, 0))
+        jobs.run_batch()
+        self.assertEqual(self.enqueue(force=True), (3, 0))
+
+    def test_changed_and_failed_students_are_queued_again(self):
+        self.enqueue()
+        jobs.run_batch()
+        changed, failed, _ = self.students
+        changed.name = 'Ledger Renamed'  # a different certificate
+        changed.save()
+        # a send that ended in ERROR leaves nothing in the ledger and no open item
+        DeliveryLedger.objects.filter(student=failed).delete()
+        SendJobItem.objects.filter(student=failed).update(state='ERROR')
+        self.assertEqual(self.enqueue(), (2, 1))
+        self.assertEqual(set(SendJobItem.objects.filter(state='PENDING').values_list('student_id', flat=True)),
+                         {changed.sno, failed.sno})
+
+
+@override_settings(CERT_RENDER_WORKERS=1)
+class BenchmarkTests(TestCase):
+
+    def test_bulk_send_benchmark_sends_on_every_pass(self):
+        result, = bench_bulk_send(3, alloc=True)  # a timed pass, then a tracemalloc pass
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(DeliveryLedger.objects.count(), 3)
+        self.assertIn('peak_kb', result)
@@ -0,0 +1,62 @@
+"""
+List page cache: only on with a shared backend, and invalidated by saves and deletes.
+"""
+import shutil, tempfile
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import listcache
+from ..models import Student, Template
+
+SHARED = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+class ListCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = override_settings(CACHES={'default': {'BACKEND': SHARED, 'LOCATION': location}}, CERT_LIST_CACHE_TIMEOUT=300)
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.client.force_login(self.user)
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        return response, [q['sql'] for q in queries if 'portal_' in q['sql']]
+
+    def test_per_process_backends_leave_caching_off(self):
+        self.assertEqual(listcache.cache_timeout(), 300)
+        for backend in listcache.LOCAL_BACKENDS:
+            with self.subTest(backend), override_settings(CACHES={'default': {'BACKEND': backend}}):
+                self.assertEqual(listcache.cache_timeout(), 0)
+
+    def test_student_save_and_delete_invalidate(self):
+        Student.objects.create(hallticket='C1', name='Cached One', course='C', email='c1@example.com')
+        response, queries = self.get('portal:students')
+        self.assertContains(response, 'Cached One')
+        self.assertTrue(queries)
+        self.assertEqual(self.get('portal:students')[1], [])  # served from the cache
+
+        added = Student.objects.create(hallticket='C2', name='Cached Two', course='C', email='c2@example.com')
+        self.assertContains(self.get('portal:students')[0], 'Cached Two')
+        added.name = 'Renamed Two'
+        added.save()
+        self.assertContains(self.get('portal:students')[0], 'Renamed Two')
+        added.delete()
+        self.assertNotContains(self.get('portal:students')[0], 'Renamed Two')
+
+    def test_template_save_and_delete_invalidate(self):
+        self.assertNotContains(self.get('portal:templates_list')[0], 'Cached Tpl')
+        tpl = Template.objects.create(name='Cached Tpl', course='C', file='templates/x.png')
+        self.assertContains(self.get('portal:templates_list')[0], 'Cached Tpl')
+        tpl.delete()
+        self.assertNotContains(self.get('portal:templates_list')[0], 'Cached Tpl')
@@ -0,0 +1,94 @@
+"""
+Mailer: connection reuse, reconnects and which SMTP errors are retried.
+"""
+import smtplib
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase
+
+from ..mailer import Mailer, is_transient
+
+
+class StubConnection:
+    """Email backend stand-in that fails its first `failures` sends with `error`."""
+
+    def __init__(self, failures=0, error=None):
+        self.failures = failures
+        self.error = error or smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.is_open = False
+        self.connections = 0
+        self.attempts = 0
+        self.sent = []
+
+    def open(self):
+        if not self.is_open:
+            self.is_open = True
+            self.connections += 1
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        self.sent.extend(messages)
+        return len(messages)
+
+
+def messages(n):
+    return [EmailMessage("Subject", "Body", to=[f"m{i}@example.com"]) for i in range(n)]
+
+
+class IsTransientTests(SimpleTestCase):
+
+    def test_retried(self):
+        for error in (smtplib.SMTPServerDisconnected("gone"), smtplib.SMTPConnectError(421, b"busy"),
+                      smtplib.SMTPDataError(451, b"try later"), TimeoutError(), ConnectionResetError()):
+            with self.subTest(error=error):
+                self.assertTrue(is_transient(error))
+
+    def test_not_retried(self):
+        for error in (smtplib.SMTPNotSupportedError("no STARTTLS"), smtplib.SMTPException("No suitable authentication method found."),
+                      smtplib.SMTPRecipientsRefused({'a@example.com': (550, b"no such user")}),
+                      smtplib.SMTPDataError(554, b"rejected"), smtplib.SMTPAuthenticationError(535, b"bad credentials"),
+                      ValueError("bad header")):
+            with self.subTest(error=error):
+                self.assertFalse(is_transient(error))
+
+
+class MailerTests(SimpleTestCase):
+
+    def test_sessions_reuse_one_connection(self):
+        stub = StubConnection()
+        results = Mailer(batch_size=2, connection=stub).send(messages(5))
+        self.assertEqual([error for _, error in results], [None] * 5)
+        self.assertEqual(len(stub.sent), 5)
+        self.assertEqual(stub.connections, 3)  # sessions of 2, 2 and 1
+        self.assertFalse(stub.is_open)
+
+    def test_reconnects_after_a_drop(self):
+        stub = StubConnection(failures=2)
+        results = Mailer(max_retries=3, backoff=0, connection=stub).send(messages(2))
+        self.assertEqual([error for _, error in results], [None, None])
+        self.assertEqual((stub.attempts, stub.connections), (4, 3))
+
+    def test_gives_up_after_max_retries(self):
+        stub = StubConnection(failures=10)
+        message = messages(1)[0]
+        error = Mailer(max_retries=2, backoff=0, connection=stub).send_one(message)
+        self.assertIsInstance(error, smtplib.SMTPServerDisconnected)
+        self.assertEqual(stub.attempts, 3)
+
+    def test_permanent_errors_are_not_retried(self):
+        for error in (smtplib.SMTPNotSupportedError("no STARTTLS"), smtplib.SMTPDataError(554, b"rejected")):
+            with self.subTest(error=error):
+                stub = StubConnection(failures=1, error=error)
+                self.assertIs(Mailer(max_retries=3, backoff=0, connection=stub).send_one(messages(1)[0]), error)
+                self.assertEqual(stub.attempts, 1)
+
+    def test_configured_backend(self):
+        results = Mailer().send(messages(3))
+        self.assertEqual([error for _, error in results], [None] * 3)
+        self.assertEqual([m.to for m in mail.outbox], [[f"m{i}@example.com"] for i in range(3)])
@@ -0,0 +1,110 @@
+"""
+Metrics files shared between processes: merging, and retiring the files of exited or silent processes.
+Request metrics for streaming responses.
+"""
+import json, os, shutil, tempfile, time
+from pathlib import Path
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..models import Student
+
+DEAD_PID = 2 ** 22 + 1  # above Linux's pid_max, never running
+
+
+def count(data, view='v'):
+    return data.get(('portal_request_queries', (('view', view),)), [None, 0, 0])[2]
+
+
+class MetricsDirTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        shared = override_settings(CERT_METRICS_DIR=self.dir, CERT_METRICS_MAX_AGE=3600)
+        shared.enable()
+        self.addCleanup(shared.disable)
+        # a fresh registry, as in a newly started process
+        registry = mock.patch.multiple(metrics, _data={}, _name=None, _flushed={}, _owner=os.getpid())
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def other_process(self, pid, n, age=0):
+        path = self.dir / f"{pid}-0000.json"
+        path.write_text(json.dumps([['portal_request_queries', [['view', 'v']], [n] + [0] * 10, float(n), n]]))
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def observe(self, n):
+        for _ in range(n):
+            metrics.observe('portal_request_queries', 1, view='v')
+
+    def test_live_processes_are_merged(self):
+        self.observe(2)
+        self.other_process(os.getppid(), 3)
+        self.assertEqual(count(metrics.collect()), 5)
+        self.assertEqual(len(list(self.dir.glob('*-*.json'))), 2)
+
+    def test_exited_processes_are_retired_once(self):
+        self.observe(1)
+        dead = self.other_process(DEAD_PID, 4)
+        self.assertEqual(count(metrics.collect()), 5)
+        self.assertFalse(dead.exists())
+        self.assertEqual(count(metrics.collect()), 5)
+        self.assertEqual(json.loads((self.dir / metrics.RETIRED).read_text())['files'], [])
+
+    def test_a_reused_pid_gets_its_own_file(self):
+        stale = self.other_process(os.getpid(), 4, age=7200)  # an earlier process with our PID
+        self.observe(1)
+        metrics.flush()
+        self.assertTrue(stale.exists())
+        self.assertEqual(count(metrics.collect()), 5)  # too old: retired, not overwritten
+        self.assertFalse(stale.exists())
+
+    def test_idle_process_retired_by_another_carries_on(self):
+        self.observe(3)
+        metrics.flush()
+        own = self.dir / metrics._name
+        os.utime(own, (time.time() - 7200,) * 2)
+        with mock.patch.object(metrics, '_name', 'someone-else.json'):
+            with metrics._folder_lock(self.dir):
+                metrics._retire(self.dir)
+        self.assertFalse(own.exists())
+        self.observe(2)
+        self.assertEqual(count(metrics.collect()), 5)
+        self.assertEqual(count(metrics._snapshot()), 2)  # only what retired.json doesn't hold
+
+    def test_forked_child_starts_from_zero(self):
+        self.observe(3)
+        with mock.patch.object(metrics, '_owner', -1):
+            self.observe(1)
+            self.assertEqual(count(metrics._snapshot()), 1)
+
+
+@override_settings(CERT_METRICS_LOG_REQUESTS=True)
+class StreamingRequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        Student.objects.bulk_create([Student(hallticket=f"M{i}", name=f"M {i}", course='CSE') for i in range(5)])
+
+    def export_queries(self, chunk_size):
+        self.client.force_login(self.user)
+        with self.settings(CERT_EXPORT_CHUNK_SIZE=chunk_size):
+            with self.assertNoLogs('portal.requests'):
+                response = self.client.get(reverse('portal:students_export'))
+            with self.assertLogs('portal.requests') as logs:
+                body = b''.join(response.streaming_content)
+        self.assertEqual(body.count(b'\n'), 6)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'portal:students_export')
+        return line['queries']
+
+    def test_queries_run_while_streaming_are_counted(self):
+        # 5 rows: three chunk queries at 2 per chunk, one at 100
+        self.assertEqual(self.export_queries(2) - self.export_queries(100), 2)
@@ -0,0 +1,74 @@
+"""
+Keyset pagination: next / previous / last tokens and tampered cursors.
+"""
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Student, SendLog
+from ..pagination import keyset_page, last_token, encode
+
+
+class KeysetPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Student.objects.bulk_create(Student(sno=i, hallticket=f"P{i}", name=f"Page {i}", course='PG', email=f"p{i}@example.com")
+                                    for i in range(1, 13))
+        # three logs per second so the id tie-breaker matters
+        start = timezone.now()
+        SendLog.objects.bulk_create(SendLog(id=i, recipient_email=f"l{i}@example.com", status='SUCCESS',
+                                            sent_at=start + timedelta(seconds=i // 3)) for i in range(1, 11))
+
+    def page(self, token=None):
+        return keyset_page(Student.objects.all(), ['sno'], token, per_page=5)
+
+    def snos(self, page):
+        return [s.sno for s in page]
+
+    def test_walk_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(self.snos(first), [1, 2, 3, 4, 5])
+        self.assertFalse(first.has_previous)
+        second = self.page(first.next_token)
+        self.assertEqual(self.snos(second), [6, 7, 8, 9, 10])
+        self.assertTrue(second.has_previous and second.has_next)
+        third = self.page(second.next_token)
+        self.assertEqual(self.snos(third), [11, 12])
+        self.assertFalse(third.has_next)
+        back = self.page(third.prev_token)
+        self.assertEqual(self.snos(back), [6, 7, 8, 9, 10])
+        self.assertEqual(self.snos(self.page(back.prev_token)), [1, 2, 3, 4, 5])
+        self.assertFalse(self.page(back.prev_token).has_previous)
+
+    def test_last_page(self):
+        last = self.page(last_token())
+        self.assertEqual(self.snos(last), [8, 9, 10, 11, 12])
+        self.assertFalse(last.has_next)
+        self.assertEqual(self.snos(self.page(last.prev_token)), [3, 4, 5, 6, 7])
+
+    def test_bad_tokens_fall_back_to_the_first_page(self):
+        token = self.page().next_token
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        wrong_arity = encode([1, 2], 'next')
+        wrong_type = encode(['not-a-number'], 'next')
+        for bad in (tampered, 'garbage', wrong_arity, wrong_type):
+            with self.subTest(token=bad):
+                self.assertEqual(self.snos(self.page(bad)), [1, 2, 3, 4, 5])
+
+    def test_empty(self):
+        page = keyset_page(Student.objects.none(), ['sno'], None, per_page=5)
+        self.assertEqual((list(page), page.has_other_pages), ([], False))
+
+    def test_descending_composite_keys(self):
+        qs = SendLog.objects.all()
+        seen = []
+        page = keyset_page(qs, ['sent_at', 'id'], None, per_page=4, descending=True)
+        while True:
+            seen.append([log.id for log in page])
+            if not page.has_next:
+                break
+            page = keyset_page(qs, ['sent_at', 'id'], page.next_token, per_page=4, descending=True)
+        self.assertEqual(seen, [[10, 9, 8, 7], [6, 5, 4, 3], [2, 1]])
+        back = keyset_page(qs, ['sent_at', 'id'], page.prev_token, per_page=4, descending=True)
+        self.assertEqual([log.id for log in back], [6, 5, 4, 3])
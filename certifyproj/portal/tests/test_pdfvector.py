@@ -0,0 +1,96 @@
+"""
+Vector PDFs: the file structure is consistent and the text is what was asked for.
+"""
+import os, re, shutil, tempfile, zlib
+from django.test import SimpleTestCase
+from PIL import Image
+
+from ..pdfvector import write_pdf, save_certificate_vector
+
+
+def parse(data):
+    """{object number: body bytes} read through the xref table, checking every offset on the way."""
+    start = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+    m = re.compile(rb"xref\n0 (\d+)\n").match(data, start)
+    assert m, "startxref does not point at the xref table"
+    size = int(m.group(1))
+    entries = data[m.end():m.end() + 20 * size]
+    objects = {}
+    for num in range(1, size):
+        offset = int(entries[20 * num:20 * num + 10])
+        header = b"%d 0 obj\n" % num
+        assert data.startswith(header, offset), f"xref offset of object {num} is wrong"
+        objects[num] = data[offset + len(header):data.index(b"\nendobj\n", offset)]
+    trailer = data[m.end() + 20 * size:data.rindex(b"startxref")]
+    assert b"/Size %d" % size in trailer and b"/Root 1 0 R" in trailer
+    return objects
+
+
+def stream(body):
+    length = int(re.search(rb"/Length (\d+)", body).group(1))
+    raw = body[body.index(b"\nstream\n") + 8:][:length]
+    return zlib.decompress(raw) if b"/FlateDecode" in body.split(b"stream")[0] else raw
+
+
+def page_texts(objects):
+    pages = [n for n, body in sorted(objects.items()) if body.startswith(b"<< /Type /Page ")]
+    texts = []
+    for n in pages:
+        contents = int(re.search(rb"/Contents (\d+) 0 R", objects[n]).group(1))
+        texts.append(re.findall(rb"\((.*?)\) Tj", stream(objects[contents])))
+    return texts
+
+
+class VectorPdfTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def template(self, fmt='PNG', size=(300, 200)):
+        path = os.path.join(self.dir, f"template.{fmt.lower()}")
+        Image.new('RGB', size, (250, 245, 230)).save(path, fmt)
+        return path
+
+    def test_single_certificate(self):
+        path = save_certificate_vector(self.template(), "Asha Rao", "CSE", "18-10-2026", self.dir, "HT1")
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b"%PDF-1.4\n"))
+        objects = parse(data)
+        self.assertIn(b"/Count 1", objects[2])
+        self.assertIn(b"/Width 300 /Height 200", objects[4])
+        self.assertEqual(len(stream(objects[4])), 300 * 200 * 3)
+        self.assertEqual(page_texts(objects), [[b"Asha Rao", b"Course: CSE", b"Date: 18-10-2026"]])
+        # 150 DPI: 300 px is 144 pt
+        self.assertIn(b"/MediaBox [0 0 144.00 96.00]", objects[5])
+
+    def test_jpeg_template_is_embedded_as_is(self):
+        template = self.template('JPEG')
+        out = os.path.join(self.dir, "jpeg.pdf")
+        write_pdf(out, template, [("A", "B", "C")])
+        with open(out, 'rb') as f:
+            objects = parse(f.read())
+        self.assertIn(b"/Filter /DCTDecode", objects[4])
+        with open(template, 'rb') as f:
+            self.assertEqual(stream(objects[4]), f.read())
+
+    def test_batch_pages_share_one_background(self):
+        out = os.path.join(self.dir, "batch.pdf")
+        pages = ((f"Student {i}", "ECE", "01-01-2026") for i in range(3))
+        self.assertEqual(write_pdf(out, self.template(), pages), 3)
+        with open(out, 'rb') as f:
+            objects = parse(f.read())
+        self.assertIn(b"/Count 3", objects[2])
+        self.assertEqual(sum(body.startswith(b"<< /Type /XObject") for body in objects.values()), 1)
+        self.assertEqual([texts[0] for texts in page_texts(objects)], [b"Student 0", b"Student 1", b"Student 2"])
+
+    def test_text_outside_cp1252(self):
+        out = os.path.join(self.dir, "names.pdf")
+        write_pdf(out, self.template(), [("राम Kumar", "Café (Evening)", "01-01-2026"), ("back\\slash", "x", "y")])
+        with open(out, 'rb') as f:
+            objects = parse(f.read())
+        first, second = page_texts(objects)
+        self.assertEqual(first[0], b"??? Kumar")
+        self.assertEqual(first[1], "Course: Café \\(Evening\\)".encode('cp1252'))
+        self.assertEqual(second[0], b"back\\\\slash")
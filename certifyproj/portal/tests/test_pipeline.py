@@ -0,0 +1,139 @@
+"""
+Staged pipeline: items flow through every stage, and a failing stage settles what it held and still shuts down.
+"""
+import threading
+from unittest import mock
+from django.core import mail
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from .. import jobs, pipeline, stats
+from ..benchmarks import make_template
+from ..models import Student, SendJobItem, SendLog, DeliveryStat
+
+
+def run(source, stages, depth=2):
+    # fail instead of hanging the suite if shutdown deadlocks
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pipeline.run(source, stages, depth)), daemon=True)
+    thread.start()
+    thread.join(10)
+    if thread.is_alive():
+        raise AssertionError("pipeline did not shut down")
+    return result[0]
+
+
+class RunTests(SimpleTestCase):
+
+    def test_items_flow_through_every_stage(self):
+        seen, batches, teardowns = [], [], []
+
+        def collect(state, items):
+            batches.append(len(items))
+            seen.extend(items)
+            return items
+
+        stages = [pipeline.Stage('double', lambda state, n: n * 2, workers=3),
+                  pipeline.Stage('collect', collect, batch=7, setup=lambda: 'state', teardown=teardowns.append)]
+        self.assertEqual(run(range(100), stages), [])
+        self.assertEqual(sorted(seen), [n * 2 for n in range(100)])
+        self.assertLessEqual(max(batches), 7)
+        self.assertEqual(teardowns, ['state'])
+
+    def test_failing_stage_hands_over_its_items_and_shuts_down(self):
+        dropped, seen = [], []
+
+        def odd_fails(state, n):
+            if n % 2:
+                raise ValueError(n)
+            return n
+
+        stages = [pipeline.Stage('check', odd_fails, workers=2, on_error=lambda items, e: dropped.extend(items)),
+                  pipeline.Stage('collect', lambda state, items: seen.extend(items) or items, batch=5)]
+        errors = run(range(40), stages)
+        self.assertEqual(len(errors), 20)
+        self.assertEqual({name for name, _ in errors}, {'check'})
+        self.assertEqual(sorted(dropped), list(range(1, 40, 2)))
+        self.assertEqual(sorted(seen), list(range(0, 40, 2)))
+
+    def test_failing_batch_stage_and_handler(self):
+        def handler(items, error):
+            raise RuntimeError("handler broke")
+
+        stages = [pipeline.Stage('write', mock.Mock(side_effect=DatabaseError("down")), batch=10, on_error=handler)]
+        errors = run(range(25), stages)
+        self.assertTrue(errors)
+        self.assertEqual(len(errors) % 2, 0)  # each failed call, then its handler
+        self.assertIsInstance(errors[1][1], RuntimeError)
+
+
+class SerialStage(pipeline.Stage):
+    # the shared in-memory SQLite test database answers "table is locked" instead of
+    # waiting like a server database would, so stage calls that write take turns here
+    lock = threading.RLock()
+
+    def __init__(self, name, func, on_error=None, **kwargs):
+        super().__init__(name, self.serial(func), on_error=on_error and self.serial(on_error), **kwargs)
+
+    @classmethod
+    def serial(cls, func):
+        def call(*args):
+            with cls.lock:
+                return func(*args)
+        return call
+
+
+@override_settings(CERT_RENDER_WORKERS=1, CERT_PIPELINE_DELIVER_WORKERS=2, CERT_PIPELINE_QUEUE_DEPTH=2,
+                   CERT_PIPELINE_DB_BATCH=2, CERT_SEND_MAX_ATTEMPTS=3, CERT_EMAIL_DOMAIN_RATE=0)
+class RunPipelineTests(TransactionTestCase):
+
+    def setUp(self):
+        for patch in (mock.patch.object(pipeline, 'Stage', SerialStage),
+                      mock.patch.object(jobs, 'claim_batch', SerialStage.serial(jobs.claim_batch))):
+            patch.start()
+            self.addCleanup(patch.stop)
+        make_template((200, 150), course='PIPE')
+        students = [Student.objects.create(hallticket=f"P{n}", name=f"Pipe {n}", course='PIPE', email=f"p{n}@example.com")
+                    for n in range(5)]
+        self.job = jobs.enqueue([s.sno for s in students], force=True)
+
+    def states(self):
+        return sorted(self.job.items.values_list('state', flat=True))
+
+    def test_delivers_everything(self):
+        self.assertEqual(jobs.run_pipeline(), 5)
+        self.assertEqual(self.states(), ['SUCCESS'] * 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(SendLog.objects.filter(status='SUCCESS').count(), 5)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'DONE')
+
+    def test_items_of_a_failing_stage_are_failed_not_left_claimed(self):
+        with mock.patch.object(jobs._Writes, 'save_certificates', side_effect=DatabaseError("disk full")):
+            with self.assertRaises(RuntimeError):
+                jobs.run_pipeline()
+        self.assertEqual(self.states(), ['PENDING'] * 5)
+        self.assertTrue(all('disk full' in e for e in SendJobItem.objects.values_list('last_error', flat=True)))
+        self.assertFalse(SendJobItem.objects.filter(retry_after=None).exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_items_sent_before_a_failed_log_write_stay_delivered(self):
+        with mock.patch.object(SendLog.objects, 'bulk_create', side_effect=DatabaseError("log table locked")):
+            with self.assertRaises(RuntimeError):
+                jobs.run_pipeline()
+        self.assertEqual(self.states(), ['SUCCESS'] * 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(jobs.run_pipeline(), 0)
+
+    def test_a_log_stage_failing_after_its_writes_does_not_record_twice(self):
+        for target, name in ((stats, 'record_logs'), (jobs, 'finish_jobs')):
+            with self.subTest(name):
+                with mock.patch.object(target, name, side_effect=DatabaseError("after the log write")):
+                    with self.assertRaises(RuntimeError):
+                        jobs.run_pipeline()
+                self.assertEqual(self.states(), ['SUCCESS'] * 5)
+                self.assertEqual(SendLog.objects.count(), 5)
+                self.assertLessEqual(stats.totals()['sent'], 5)
+            SendLog.objects.all().delete()
+            DeliveryStat.objects.all().delete()
+            self.job = jobs.enqueue(list(Student.objects.values_list('sno', flat=True)), force=True)
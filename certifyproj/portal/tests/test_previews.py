@@ -0,0 +1,96 @@
+"""
+Certificate previews: conditional requests, the disk cache and its size bound.
+"""
+import os, shutil, tempfile, time
+from pathlib import Path
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import previews
+from ..benchmarks import make_template
+from ..models import Student
+from .test_templates import image_bytes
+
+
+class PreviewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        cls.template = make_template((400, 300), course='PREV')
+        cls.student = Student.objects.create(hallticket='V1', name='Preview One', course='PREV', email='v1@example.com')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        cache = override_settings(CERT_PREVIEW_DIR=self.dir, CERT_PREVIEW_MAX_AGE=60)
+        cache.enable()
+        self.addCleanup(cache.disable)
+        self.client.force_login(self.user)
+
+    def get(self, **headers):
+        return self.client.get(reverse('portal:student_preview', args=[self.student.sno]), {'format': 'jpeg'}, headers=headers)
+
+    def test_headers(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        key = previews.preview_key(self.template.render_path, 'Preview One', 'PREV', 'jpeg', 800)
+        self.assertEqual(response['ETag'], f'"{key}"')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        self.assertIn('Accept', response['Vary'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        with mock.patch.object(previews, 'generate_certificate_image') as render:
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        render.assert_not_called()
+        self.assertEqual(self.get(if_none_match='"stale"').status_code, 200)
+
+    def test_cache_hit_does_not_render_again(self):
+        first = self.get().content
+        with mock.patch.object(previews, 'generate_certificate_image') as render:
+            self.assertEqual(self.get().content, first)
+        render.assert_not_called()
+        self.assertEqual(len(list(Path(self.dir).rglob('*.jpeg'))), 1)
+
+    def test_template_edit_makes_a_new_key(self):
+        url = reverse('portal:template_preview', args=[self.template.pk])
+        before = self.client.get(url, {'format': 'jpeg'})['ETag']
+        upload = SimpleUploadedFile('new.png', image_bytes((400, 300), color=(10, 10, 120)))
+        self.client.post(reverse('portal:template_edit', args=[self.template.pk]),
+                         {'name': 'Prev', 'course': 'PREV', 'template_type': 'landscape', 'file': upload})
+        after = self.client.get(url, {'format': 'jpeg'}, headers={'if_none_match': before})
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before)
+
+
+class EvictTests(TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        cache = override_settings(CERT_PREVIEW_DIR=self.dir)
+        cache.enable()
+        self.addCleanup(cache.disable)
+
+    def test_least_recently_used_files_go_first(self):
+        now = time.time()
+        paths = []
+        for i in range(10):
+            path = self.dir / f"{i:02d}" / f"{i}.jpeg"
+            path.parent.mkdir()
+            path.write_bytes(b'x' * 100)
+            os.utime(path, (now - 100 + i, now - 100 + i))  # 0 is the oldest
+            paths.append(path)
+        os.utime(paths[0])  # a hit makes it recent again
+
+        self.assertEqual(previews.evict(limit=1000), 0)
+        self.assertEqual(previews.evict(limit=500), 6)  # down to 400 bytes, under 90% of the limit
+        self.assertEqual([p.name for p in paths if p.exists()], ['0.jpeg', '7.jpeg', '8.jpeg', '9.jpeg'])
@@ -0,0 +1,86 @@
+"""
+Render cache: decoded templates are reused until their file changes, bounded by bytes, and dropped on edit.
+"""
+import os, shutil, tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import utils
+from ..models import Template
+from .test_templates import image_bytes
+
+
+class RenderCacheTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        utils.invalidate_template_cache()
+        self.addCleanup(utils.invalidate_template_cache)
+
+    def image(self, name, size=(100, 50), color=(10, 20, 30)):
+        path = os.path.join(self.dir, name)
+        Image.new('RGB', size, color).save(path)
+        return path
+
+    def test_hit_reuses_the_decoded_image(self):
+        path = self.image('a.png')
+        first = utils._load_base_image(path)
+        with mock.patch.object(utils.Image, 'open', side_effect=AssertionError("decoded again")):
+            self.assertIs(utils._load_base_image(path), first)
+
+    def test_changed_file_is_reloaded(self):
+        path = self.image('a.png')
+        first = utils._load_base_image(path)
+        self.image('a.png', size=(80, 40))
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        second = utils._load_base_image(path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.size, (80, 40))
+        self.assertEqual(utils._base_bytes, 80 * 40 * 3)
+
+    @override_settings(CERT_RENDER_CACHE_BYTES=100 * 50 * 3 + 10)
+    def test_least_recently_used_is_evicted_past_the_limit(self):
+        a, b, big = self.image('a.png'), self.image('b.png'), self.image('big.png', size=(200, 100))
+        utils._load_base_image(a)
+        utils._load_base_image(b)
+        self.assertEqual(list(utils._base_images), [b])
+        utils._load_base_image(big)  # larger than the whole cache: used, not kept
+        self.assertEqual(list(utils._base_images), [b])
+        self.assertLessEqual(utils._base_bytes, 100 * 50 * 3 + 10)
+
+    def test_digests_are_bounded(self):
+        paths = [self.image(f"{n}.png", color=(n, 0, 0)) for n in range(3)]
+        with mock.patch.object(utils, 'MAX_CACHED_DIGESTS', 2), mock.patch.object(utils, '_digests', utils.OrderedDict()):
+            digests = [utils.template_digest(p) for p in paths]
+            self.assertEqual(len(set(digests)), 3)
+            self.assertEqual(list(utils._digests), paths[1:])
+
+
+class TemplateEditInvalidatesTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='x', is_staff=True))
+        utils.invalidate_template_cache()
+        self.addCleanup(utils.invalidate_template_cache)
+
+    def test_edit_drops_the_cached_image(self):
+        upload = SimpleUploadedFile('t.png', image_bytes((300, 200)))
+        self.client.post(reverse('portal:template_add'), {'name': 'T', 'course': 'C', 'template_type': 'landscape', 'file': upload})
+        tpl = Template.objects.get()
+        old = utils._load_base_image(tpl.render_path)
+        self.assertIn(tpl.render_path, utils._base_images)
+
+        upload = SimpleUploadedFile('t2.png', image_bytes((200, 300)))
+        response = self.client.post(reverse('portal:template_edit', args=[tpl.pk]),
+                                    {'name': 'T', 'course': 'C', 'template_type': 'landscape', 'file': upload})
+        self.assertEqual(response.status_code, 302)
+        tpl.refresh_from_db()
+        self.assertEqual(list(utils._base_images), [])
+        self.assertEqual(utils._load_base_image(tpl.render_path).size, (200, 300))
+        self.assertNotEqual(old.size, (200, 300))
@@ -0,0 +1,48 @@
+"""
+Render pool: a pool that lost a worker is replaced instead of failing every later batch.
+"""
+import os, shutil, tempfile
+from concurrent.futures.process import BrokenProcessPool
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from .. import rendering
+
+
+@override_settings(CERT_RENDER_WORKERS=2, CERT_PDF_ENGINE='raster')
+class RenderPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.addCleanup(rendering.shutdown_pool)
+        self.template = os.path.join(self.dir, 'template.png')
+        Image.new('RGB', (200, 150), (240, 240, 240)).save(self.template)
+
+    def tasks(self, prefix, n=2):
+        return [(self.template, f"Student {i}", "POOL", "01-01-2026", self.dir, f"{prefix}{i}") for i in range(n)]
+
+    def kill_a_worker(self):
+        pool = rendering._get_pool()
+        with self.assertRaises(BrokenProcessPool):
+            rendering._result(pool, pool.submit(os._exit, 1))
+        return pool
+
+    def test_pool_uses_spawn(self):
+        self.assertEqual(rendering._get_pool()._mp_context.get_start_method(), 'spawn')
+
+    def test_broken_pool_is_replaced(self):
+        broken = self.kill_a_worker()
+        self.assertIsNone(rendering._pool)  # discarded where the breakage was seen
+        results = rendering.render_many(self.tasks('a'))
+        self.assertEqual(results, [os.path.join(self.dir, f"a{i}.pdf") for i in range(2)])
+        self.assertIsNot(rendering._pool, broken)
+        self.assertTrue(os.path.exists(rendering.render_one(self.tasks('b', 1)[0])))
+
+    def test_submit_to_a_pool_broken_elsewhere_retries_on_a_fresh_one(self):
+        pool = rendering._get_pool()
+        future = pool.submit(os._exit, 1)
+        with self.assertRaises(BrokenProcessPool):
+            future.result()  # seen by nobody who discards it
+        self.assertIs(rendering._pool, pool)
+        self.assertEqual(len([p for p in rendering.render_many(self.tasks('c')) if isinstance(p, str)]), 2)
@@ -0,0 +1,111 @@
+"""
+Student search on the token backend, the SQL of the FULLTEXT backend, and the bulk actions that act on a search.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Student, SendJobItem, SendLog
+from ..search import search_students, search_logs, tokenize
+
+
+class TokenizeTests(TestCase):
+
+    def test_ascii_words_and_their_letter_digit_halves(self):
+        self.assertEqual(tokenize("HT1001", "asha.k@example.com"), {'ht1001', 'ht', '1001', 'asha', 'k', 'example', 'com'})
+
+    def test_non_ascii_words_stay_whole(self):
+        # vowel signs and viramas are combining marks; they must not split the word
+        self.assertEqual(tokenize("राम Kumar"), {'राम', 'kumar'})
+        self.assertEqual(tokenize("శ్రీనివాస్"), {'శ్రీనివాస్'})
+        self.assertEqual(tokenize("José MÜLLER"), {'josé', 'müller'})
+
+    def test_punctuation_only(self):
+        self.assertEqual(tokenize(".", "@", " - "), set())
+
+
+@override_settings(CERT_SEARCH_BACKEND='tokens')
+class SearchStudentsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ram = Student.objects.create(hallticket='HT1001', name='राम Kumar', course='CSE', email='ram@example.com')
+        cls.sita = Student.objects.create(hallticket='HT1002', name='Sita Devi', course='ECE', email='sita@example.com')
+        cls.john = Student.objects.create(hallticket='XY7', name='John', course='CSE', email='john@mail.org')
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+
+    def search(self, q):
+        return list(search_students(Student.objects.all(), q))
+
+    def test_matches(self):
+        cases = {
+            '': [self.ram, self.sita, self.john],
+            'राम': [self.ram],
+            'kum': [self.ram],
+            'ht100': [self.ram, self.sita],
+            '1002': [self.sita],
+            'cse john': [self.john],
+            'mail.org': [self.john],
+            'Sita nobody': [],
+        }
+        for q, expected in cases.items():
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), expected)
+
+    def test_query_without_words_matches_nothing(self):
+        for q in ('.', '@', '-', ' . '):
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), [])
+
+    def test_log_search(self):
+        SendLog.objects.create(student=self.ram, recipient_email='ram@example.com', status='SUCCESS')
+        SendLog.objects.create(student=None, recipient_email='gone@example.com', status='SUCCESS')
+        logs = SendLog.objects.all()
+        self.assertEqual([log.recipient_email for log in search_logs(logs, 'राम')], ['ram@example.com'])
+        self.assertEqual([log.recipient_email for log in search_logs(logs, 'gone@')], ['gone@example.com'])
+        self.assertEqual(list(search_logs(logs, '.')), [])
+
+    def test_bulk_delete_with_a_search(self):
+        self.client.force_login(self.user)
+        url = reverse('portal:bulk_delete')
+        for q in ('.', '@'):
+            self.client.post(url, {'select_all': 'true', 'q': q})
+            self.assertEqual(Student.objects.count(), 3, q)
+        self.client.post(url, {'select_all': 'true', 'q': 'राम'})
+        self.assertEqual(list(Student.objects.all()), [self.sita, self.john])
+
+    def test_bulk_send_with_a_search(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('portal:bulk_send'), {'select_all': 'true', 'q': '@', 'force': 'true'})
+        self.assertFalse(SendJobItem.objects.exists())
+        self.client.post(reverse('portal:bulk_send'), {'select_all': 'true', 'q': 'cse', 'force': 'true'})
+        self.assertEqual(sorted(SendJobItem.objects.values_list('student__hallticket', flat=True)), ['HT1001', 'XY7'])
+
+
+@override_settings(CERT_SEARCH_BACKEND='fulltext')
+class FulltextSqlTests(TestCase):
+    # MySQL isn't available here: check the SQL that would run there
+
+    def sql(self, qs):
+        sql, params = qs.query.sql_with_params()
+        return sql, [str(p) for p in params]
+
+    def test_match_columns_follow_the_subquery_alias(self):
+        sql, params = self.sql(search_logs(SendLog.objects.all(), 'kumar'))
+        self.assertIn('MATCH(U0."name", U0."email", U0."hallticket", U0."course", U0."phone") AGAINST (%s IN BOOLEAN MODE) > %s', sql)
+        self.assertNotIn('portal_student.name', sql)
+        self.assertIn('+kumar*', params)
+
+        sql, _ = self.sql(search_students(Student.objects.all(), 'kumar'))
+        self.assertIn('MATCH("portal_student"."name", ', sql)
+
+    def test_words_innodb_cannot_answer_use_the_token_table(self):
+        sql, params = self.sql(search_students(Student.objects.all(), 'HT1001 1001 it ee kumar'))
+        self.assertIn('+ht1001* +kumar*', params)
+        self.assertEqual(sql.count('portal_studentsearchtoken'), 3)  # 1001, it, ee
+        sql, _ = self.sql(search_students(Student.objects.all(), 'it'))
+        self.assertNotIn('MATCH', sql)
+
+    def test_tokens_are_kept_for_the_fulltext_backend(self):
+        student = Student.objects.create(hallticket='HT2001', name='Asha', course='IT', email='asha@example.com')
+        self.assertTrue(student.search_tokens.filter(token='2001').exists())
@@ -0,0 +1,97 @@
+"""
+Delivery rollup: incremental updates (worker, views, admin) must agree with a rebuild from SendLog.
+"""
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from .. import jobs, stats
+from ..benchmarks import make_template
+from ..deletion import delete_students
+from ..models import Student, SendLog, DeliveryStat
+
+
+def snapshot():
+    return sorted(DeliveryStat.objects.values_list('course', 'day', *stats.COUNTERS))
+
+
+def nonzero(rows):
+    # decrements leave all-zero rows a rebuild doesn't create
+    return [row for row in rows if any(row[2:])]
+
+
+@override_settings(CERT_RENDER_WORKERS=1, CERT_SEND_MAX_ATTEMPTS=1)
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        make_template((200, 150), course='CSE')
+        make_template((200, 150), course='ECE')
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+
+    def test_incremental_matches_rebuild(self):
+        students = [Student.objects.create(hallticket=f"R{i}", name=f"Roll {i}", course=course, email=f"r{i}@example.com")
+                    for i, course in enumerate(['CSE', 'CSE', 'ECE', 'MECH'])]  # MECH has no template: an ERROR row
+        jobs.enqueue([s.sno for s in students], force=True)
+        jobs.run_batch()
+        self.assertEqual(SendLog.objects.filter(status='ERROR').count(), 1)
+
+        self.client.force_login(self.user)
+        success = SendLog.objects.filter(status='SUCCESS').order_by('id')
+        self.client.get(reverse('portal:log_resend', args=[success[0].pk]))
+        response = self.client.get(reverse('portal:log_download', args=[success[1].pk]))
+        b''.join(response.streaming_content)
+        response.close()
+
+        # rows keep the course they were sent under when the student moves or goes away
+        Student.objects.filter(pk=students[0].pk).update(course='ECE')
+        delete_students(Student.objects.filter(pk=students[2].pk))
+
+        incremental = snapshot()
+        self.assertEqual([row[0] for row in incremental], ['CSE', 'ECE', 'MECH'])
+        totals = stats.totals()
+        self.assertEqual(totals, {'sent': 3, 'failed': 1, 'resent': 1, 'downloaded': 1})
+        stats.rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+
+class AdminRollupTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        self.logs = [SendLog.objects.create(recipient_email=f"a{i}@example.com", course='CSE', status='SUCCESS',
+                                            resend_count=i) for i in range(3)]
+        stats.record_logs(self.logs)
+        stats.rebuild()
+
+    def assert_matches_rebuild(self):
+        incremental = nonzero(snapshot())
+        stats.rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_edit(self):
+        log = self.logs[1]
+        when = timezone.localtime(log.sent_at - timedelta(days=2))
+        response = self.client.post(reverse('admin:portal_sendlog_change', args=[log.pk]), {
+            'recipient_email': log.recipient_email, 'course': 'ECE', 'status': 'ERROR', 'error_reason': 'bounced',
+            'sent_at_0': when.strftime('%Y-%m-%d'), 'sent_at_1': when.strftime('%H:%M:%S'),
+            'resend_count': 4, 'download_count': 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(stats.totals(), {'sent': 2, 'failed': 1, 'resent': 6, 'downloaded': 2})
+        self.assert_matches_rebuild()
+
+    def test_add_and_delete(self):
+        now = timezone.localtime()
+        self.client.post(reverse('admin:portal_sendlog_add'), {
+            'recipient_email': 'new@example.com', 'course': 'MECH', 'status': 'ERROR', 'error_reason': '',
+            'sent_at_0': now.strftime('%Y-%m-%d'), 'sent_at_1': now.strftime('%H:%M:%S'),
+            'resend_count': 0, 'download_count': 0})
+        self.assert_matches_rebuild()
+        self.client.post(reverse('admin:portal_sendlog_delete', args=[self.logs[0].pk]), {'post': 'yes'})
+        self.client.post(reverse('admin:portal_sendlog_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [self.logs[1].pk, self.logs[2].pk]})
+        self.assertEqual(SendLog.objects.count(), 1)
+        self.assertEqual(stats.totals(), {'sent': 0, 'failed': 1, 'resent': 0, 'downloaded': 0})
+        self.assert_matches_rebuild()
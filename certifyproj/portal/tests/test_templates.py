@@ -0,0 +1,118 @@
+"""
+Template uploads: render-ready derivatives and images Pillow can't process.
+"""
+import io
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Template
+from ..utils import template_derivatives
+
+
+def image_bytes(size, fmt='PNG', mode='RGB', color=(200, 30, 30), exif=None):
+    buf = io.BytesIO()
+    im = Image.new(mode, size, color)
+    if exif is not None:
+        im.save(buf, fmt, exif=exif)
+    else:
+        im.save(buf, fmt)
+    return buf.getvalue()
+
+
+def decode(data):
+    im = Image.open(io.BytesIO(data))
+    im.load()
+    return im
+
+
+class TemplateDerivativeTests(TestCase):
+    # A4 at CERT_RENDER_DPI = 150: 1754 x 1240 landscape
+
+    def test_large_uploads_are_downscaled_to_the_print_box(self):
+        render, thumb = template_derivatives(io.BytesIO(image_bytes((3508, 2480))), 'landscape')
+        self.assertEqual(decode(render).size, (1754, 1240))
+        self.assertEqual(decode(thumb).size, (320, 226))
+        render, _ = template_derivatives(io.BytesIO(image_bytes((2480, 3508))), 'portrait')
+        self.assertEqual(decode(render).size, (1240, 1754))
+
+    def test_small_uploads_keep_their_size(self):
+        render, _ = template_derivatives(io.BytesIO(image_bytes((800, 600))), 'landscape')
+        self.assertEqual((decode(render).size, decode(render).mode), ((800, 600), 'RGB'))
+
+    def test_render_image_is_lossless_unless_the_upload_was_jpeg(self):
+        im = Image.new('RGB', (300, 200), (255, 255, 255))
+        im.paste((10, 120, 250), (0, 0, 150, 200))  # a hard edge JPEG would blur
+        buf = io.BytesIO()
+        im.save(buf, 'PNG')
+        render, thumb = template_derivatives(io.BytesIO(buf.getvalue()), 'landscape')
+        self.assertEqual(decode(render).format, 'PNG')
+        self.assertEqual(decode(render).tobytes(), im.tobytes())
+        self.assertEqual(decode(thumb).format, 'JPEG')
+        render, _ = template_derivatives(io.BytesIO(image_bytes((300, 200), 'JPEG')), 'landscape')
+        self.assertEqual(decode(render).format, 'JPEG')
+
+    def test_exif_rotation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+        render, _ = template_derivatives(io.BytesIO(image_bytes((600, 400), 'JPEG', exif=exif)), 'landscape')
+        self.assertEqual(decode(render).size, (400, 600))
+
+    def test_transparency_is_flattened_onto_white(self):
+        render, _ = template_derivatives(io.BytesIO(image_bytes((100, 100), mode='RGBA', color=(0, 0, 0, 0))), 'landscape')
+        r, g, b = decode(render).getpixel((50, 50))
+        self.assertGreater(min(r, g, b), 245)
+
+
+class TemplateUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, url, data, name='t.png', template_type='landscape'):
+        upload = SimpleUploadedFile(name, data)
+        return self.client.post(url, {'name': 'Tpl', 'course': 'CSE', 'template_type': template_type, 'file': upload})
+
+    def test_create_builds_derivatives(self):
+        response = self.post(reverse('portal:template_add'), image_bytes((3000, 2000)))
+        self.assertRedirects(response, reverse('portal:templates_list'), fetch_redirect_response=False)
+        tpl = Template.objects.get()
+        self.assertTrue(tpl.render_file and tpl.thumbnail)
+        self.assertEqual(tpl.render_path, tpl.render_file.path)
+        self.assertTrue(tpl.render_file.name.endswith('.png'))
+        with Image.open(tpl.render_path) as im:
+            self.assertEqual((im.size, im.format), ((1754, 1169), 'PNG'))
+
+    def test_unprocessable_images_are_form_errors(self):
+        truncated = image_bytes((600, 400), 'JPEG')[:400]
+        for name, data in (('junk.png', b'not an image at all'), ('cut.jpg', truncated)):
+            with self.subTest(name):
+                response = self.post(reverse('portal:template_add'), data, name=name)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['form'].has_error('file'))
+                self.assertFalse(Template.objects.exists())
+
+    def test_edit(self):
+        self.post(reverse('portal:template_add'), image_bytes((3000, 2000)))
+        tpl = Template.objects.get()
+        url = reverse('portal:template_edit', args=[tpl.pk])
+        first = (tpl.file.name, tpl.render_file.name)
+
+        # a bad replacement keeps the template as it was
+        response = self.post(url, b'broken', name='broken.png')
+        self.assertTrue(response.context['form'].has_error('file'))
+        tpl.refresh_from_db()
+        self.assertEqual((tpl.file.name, tpl.render_file.name), first)
+
+        # switching orientation rebuilds from the stored file, into the portrait box
+        response = self.client.post(url, {'name': 'Tpl', 'course': 'CSE', 'template_type': 'portrait'})
+        self.assertEqual(response.status_code, 302)
+        tpl.refresh_from_db()
+        with Image.open(tpl.render_path) as im:
+            self.assertEqual(im.size, (1240, 827))
@@ -1,27 +1,131 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from django.core.files.base import ContentFile
 from django.conf import settings
 from django.utils import timezone
+from collections import OrderedDict
 from pathlib import Path
-import io, os
+from . import metrics
+import hashlib, io, os, threading
 
 # choose a bundled-safe fallback font if no TTF available
 DEFAULT_FONT = str(Path(settings.BASE_DIR) / 'static' / 'fonts' / 'DejaVuSans.ttf')
 
+# bump whenever generate_certificate_image/save_certificate output changes,
+# so cached certificate files are not reused across layouts
+LAYOUT_VERSION = 1
+
+# ----- render cache -----
+# decoded RGB template images (keyed by path, validated by mtime) and fonts
+# (keyed by size), shared by every render in this process. Images are evicted
+# least-recently-used once their decoded size passes CERT_RENDER_CACHE_BYTES.
+_cache_lock = threading.Lock()
+_base_images = OrderedDict()   # path -> (mtime_ns, image)
+_base_bytes = 0
+_fonts = OrderedDict()         # size -> font
+MAX_CACHED_FONTS = 32
+
+def _image_bytes(im):
+    return im.width * im.height * len(im.getbands())
+
+def _cache_limit():
+    return getattr(settings, 'CERT_RENDER_CACHE_BYTES', 256 * 1024 * 1024)
+
+def _load_base_image(template_path):
+    global _base_bytes
+    path = str(template_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        hit = _base_images.get(path)
+        if hit and hit[0] == mtime:
+            _base_images.move_to_end(path)
+            return hit[1]
+
+    im = Image.open(path).convert("RGB")
+    size = _image_bytes(im)
+    limit = _cache_limit()
+    with _cache_lock:
+        old = _base_images.pop(path, None)
+        if old:
+            _base_bytes -= _image_bytes(old[1])
+        if size <= limit:
+            _base_images[path] = (mtime, im)
+            _base_bytes += size
+            while _base_bytes > limit and _base_images:
+                _, (_, evicted) = _base_images.popitem(last=False)
+                _base_bytes -= _image_bytes(evicted)
+    return im
+
+def _load_font(size):
+    with _cache_lock:
+        font = _fonts.get(size)
+        if font is not None:
+            _fonts.move_to_end(size)
+            return font
+    try:
+        font = ImageFont.truetype(DEFAULT_FONT, size=size)
+    except Exception:
+        font = ImageFont.load_default()
+    with _cache_lock:
+        _fonts[size] = font
+        while len(_fonts) > MAX_CACHED_FONTS:
+            _fonts.popitem(last=False)
+    return font
+
+def invalidate_template_cache(template_path=None):
+    """Drop the cached image for one template path, or everything if no path is given."""
+    global _base_bytes
+    with _cache_lock:
+        if template_path is None:
+            _base_images.clear()
+            _base_bytes = 0
+            return
+        old = _base_images.pop(str(template_path), None)
+        if old:
+            _base_bytes -= _image_bytes(old[1])
+
+def pdf_engine():
+    """'raster' (Pillow image saved as PDF) or 'vector' (portal.pdfvector)."""
+    return getattr(settings, 'CERT_PDF_ENGINE', 'raster')
+
+_digests = OrderedDict()  # path -> (mtime_ns, size, sha256)
+MAX_CACHED_DIGESTS = 1024
+
+def template_digest(template_path):
+    """sha256 of the template file, recomputed only when its mtime or size changes."""
+    path = str(template_path)
+    st = os.stat(path)
+    with _cache_lock:
+        hit = _digests.get(path)
+        if hit and hit[:2] == (st.st_mtime_ns, st.st_size):
+            _digests.move_to_end(path)
+            return hit[2]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    with _cache_lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, h.hexdigest())
+        _digests.move_to_end(path)
+        while len(_digests) > MAX_CACHED_DIGESTS:
+            _digests.popitem(last=False)
+    return h.hexdigest()
+
+def certificate_key(template_path, student_name, course, date_str):
+    """Content key for a rendered certificate: same inputs, same PDF."""
+    parts = [template_digest(template_path), student_name, course, date_str, str(LAYOUT_VERSION), pdf_engine()]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+@metrics.timed('render')
 def generate_certificate_image(template_path, student_name, course, date_str):
-    # Open template
-    im = Image.open(template_path).convert("RGB")
+    # Start from a copy of the cached template
+    im = _load_base_image(template_path).copy()
     W, H = im.size
     draw = ImageDraw.Draw(im)
 
     # Load fonts (adjust sizes)
-    try:
-        font_name = ImageFont.truetype(DEFAULT_FONT, size=int(min(W, H) * 0.06))
-        font_course = ImageFont.truetype(DEFAULT_FONT, size=int(min(W, H) * 0.045))
-        font_date = ImageFont.truetype(DEFAULT_FONT, size=int(min(W, H) * 0.035))
-    except Exception:
-        font_name = ImageFont.load_default()
-        font_course = ImageFont.load_default()
-        font_date = ImageFont.load_default()
+    font_name = _load_font(int(min(W, H) * 0.06))
+    font_course = _load_font(int(min(W, H) * 0.045))
+    font_date = _load_font(int(min(W, H) * 0.035))
 
     # Centered positions
     def center_text(text, y, font):
@@ -39,5 +143,99 @@ def save_certificate(im, out_dir, file_stem):
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{file_stem}.pdf"
-    im.save(out_path, "PDF", resolution=150.0)
+    # write then rename, so a half-written file is never picked up as a cached certificate
+    tmp_path = out_dir / f"{file_stem}.{os.getpid()}.tmp"
+    with metrics.timed('pdf_encode'):
+        buf = io.BytesIO()
+        im.save(buf, "PDF", resolution=150.0)
+    with metrics.timed('disk_write'):
+        tmp_path.write_bytes(buf.getvalue())
+        os.replace(tmp_path, out_path)
     return str(out_path)
+
+def iter_chunks(qs, chunk_size=1000, key='pk'):
+    """Yield lists of rows from qs in `key` order, one query per chunk.
+
+    Uses keyset filtering (key > last seen) instead of OFFSET or a server-side
+    cursor, so memory stays flat and every chunk costs the same on MySQL.
+    """
+    qs = qs.order_by(key)
+    last = None
+    while True:
+        page = qs.filter(**{f'{key}__gt': last}) if last is not None else qs
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = getattr(rows[-1], key)
+
+# ----- template derivatives -----
+THUMBNAIL_SIZE = (320, 320)
+
+def _print_box(template_type):
+    dpi = getattr(settings, 'CERT_RENDER_DPI', 150)
+    long_in, short_in = getattr(settings, 'CERT_PRINT_SIZE_INCHES', (11.69, 8.27))
+    box = (round(long_in * dpi), round(short_in * dpi))
+    return box if template_type != 'portrait' else box[::-1]
+
+def _to_rgb(im):
+    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+        # flatten transparency onto white paper
+        im = im.convert('RGBA')
+        bg = Image.new('RGB', im.size, (255, 255, 255))
+        bg.paste(im, mask=im.getchannel('A'))
+        return bg
+    return im.convert('RGB')
+
+def _jpeg_bytes(im, quality):
+    buf = io.BytesIO()
+    im.save(buf, 'JPEG', quality=quality, optimize=True)
+    return buf.getvalue()
+
+def _png_bytes(im):
+    buf = io.BytesIO()
+    im.save(buf, 'PNG')
+    return buf.getvalue()
+
+def _derivative_ext(data):
+    return '.png' if data.startswith(b'\x89PNG') else '.jpg'
+
+# Pillow's ways of saying "not a usable image": unknown format, truncated data, decompression bomb
+IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+def template_derivatives(source, template_type):
+    """(render bytes, thumbnail JPEG bytes) for an image path or file object; raises IMAGE_ERRORS.
+
+    The render image is what certificates are drawn on, so it differs from the
+    upload: EXIF orientation is applied, transparency is flattened onto white,
+    and anything larger than the print box (CERT_PRINT_SIZE_INCHES at
+    CERT_RENDER_DPI) is downscaled to fit it. Smaller images keep their size.
+    It is PNG, so it loses nothing beyond that, except for JPEG uploads, which
+    stay JPEG (quality 92) rather than grow several times over as PNG.
+    """
+    box = _print_box(template_type)
+    with Image.open(source) as src:
+        lossy = src.format == 'JPEG'
+        src.draft('RGB', box)  # lets JPEG decode at a reduced scale
+        im = _to_rgb(ImageOps.exif_transpose(src))
+    im.thumbnail(box, Image.LANCZOS)
+    thumb = im.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    return (_jpeg_bytes(im, 92) if lossy else _png_bytes(im)), _jpeg_bytes(thumb, 80)
+
+def build_template_derivatives(tpl, derivatives=None):
+    """Write tpl.render_file and tpl.thumbnail from `derivatives` (a template_derivatives() result) or tpl.file.
+
+    Oversized or CMYK uploads are normalized once here instead of on every render.
+    """
+    derivatives = derivatives or template_derivatives(tpl.file.path, tpl.template_type)
+    stem = Path(tpl.file.name).stem
+    for field, data in zip((tpl.render_file, tpl.thumbnail), derivatives):
+        if field:
+            invalidate_template_cache(field.path)
+            field.delete(save=False)
+        field.save(stem + _derivative_ext(data), ContentFile(data), save=False)
+    tpl.save(update_fields=['render_file', 'thumbnail'])
+    return tpl
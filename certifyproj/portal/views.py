@@ -1,39 +1,59 @@
-import csv, io, time
+import csv, io, os
 from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponse
+from django.core.paginator import Paginator, Page
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, HttpResponseForbidden
 from django.contrib import messages
-from django.db.models import Q
-from django.core.mail import EmailMessage
+from django.db.models import Q, F
 from django.conf import settings
+from django.utils.http import quote_etag, parse_etags
 import json
 
-from .models import Student, Template, SendLog, Certificate
+from .models import Student, Template, SendLog, SendJob, DeliveryStat
 from .forms import TemplateForm, StudentForm, CSVImportForm
-from .utils import generate_certificate_image, save_certificate
+from .utils import invalidate_template_cache, iter_chunks, build_template_derivatives
+from .delivery import _make_and_attach_certificate, certificate_email, pick_template
+from .jobs import enqueue, job_progress
+from .mailer import Mailer
+from .importer import import_students
+from .downloads import serve_file, stream_zip
+from .previews import pick_format, preview_key, get_preview
+from .search import search_students, search_logs
+from . import stats, metrics
+from .pagination import keyset_page, last_token, approximate_count
+from .deletion import delete_students
+from .listcache import cached_list
+from . import listcache
 
 # In portal/views.py
 @login_required
 def students(request):
     q = request.GET.get('q','').strip()
     
-    qs = Student.objects.all().select_related('template').order_by('sno')
-    if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(email__icontains=q) | Q(hallticket__icontains=q) | Q(course__icontains=q))
+    cursor = request.GET.get('cursor')
     
-    total_count = qs.count()
+    def build():
+        qs = Student.objects.all().select_related('template')
+        if q:
+            qs = search_students(qs, q)
+        # one COUNT at most: the planner estimate stands in for it when allowed
+        total_count = None
+        if not q and getattr(settings, 'CERT_APPROXIMATE_COUNTS', False):
+            total_count = approximate_count(Student)
+        if total_count is None:
+            total_count = qs.count()
+        return total_count, keyset_page(qs, ['sno'], cursor, per_page=5)
     
-    paginator = Paginator(qs, 5)
-    page = request.GET.get('page')
-    page_obj = paginator.get_page(page)
+    total_count, page_obj = cached_list('students', ['student', 'template'], [q, cursor], build)
 
     return render(request, 'portal/students.html', {
         'page_obj': page_obj, 
         'q': q, 
         'csv_form': CSVImportForm(),
         'total_count': total_count,
+        'last_cursor': last_token(),
+        'send_job': request.session.get('send_job'),
     })
 
 @login_required
@@ -70,23 +90,38 @@ def student_edit(request, sno):
 
 @login_required
 def student_delete(request, sno):
-    get_object_or_404(Student, sno=sno).delete()
+    get_object_or_404(Student, sno=sno)
+    delete_students(Student.objects.filter(sno=sno))
     messages.info(request, "Student deleted.")
     return redirect('portal:students')
 
+class _Echo:
+    # csv.writer target that hands each line straight back
+    def write(self, value):
+        return value
+
+def _stream_csv(filename, header, rows_chunks):
+    writer = csv.writer(_Echo())
+    def lines():
+        yield writer.writerow(header)
+        for rows in rows_chunks:
+            yield ''.join(writer.writerow(row) for row in rows)
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 def students_export_csv(request):
     q = request.GET.get('q','').strip()
-    qs = Student.objects.all().order_by('sno')
+    qs = Student.objects.all().select_related('template')
     if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(email__icontains=q) | Q(hallticket__icontains=q) | Q(course__icontains=q))
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="students.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['sno','hallticket','name','course','email','phone','template'])
-    for s in qs:
-        writer.writerow([s.sno, s.hallticket, s.name, s.course, s.email, s.phone, s.template.name if s.template else ''])
-    return response
+        qs = search_students(qs, q)
+    chunk_size = getattr(settings, 'CERT_EXPORT_CHUNK_SIZE', 2000)
+    rows = (
+        [[s.sno, s.hallticket, s.name, s.course, s.email, s.phone, s.template.name if s.template else ''] for s in chunk]
+        for chunk in iter_chunks(qs, chunk_size, key='sno')
+    )
+    return _stream_csv('students.csv', ['sno','hallticket','name','course','email','phone','template'], rows)
 
 # In portal/views.py
 @login_required
@@ -100,80 +135,18 @@ def students_import_csv(request):
         return redirect('portal:students')
 
     f = form.cleaned_data['file']
-    data = io.TextIOWrapper(f.file, encoding='utf-8')
-    reader = csv.DictReader(data)
+    summary = import_students(io.TextIOWrapper(f.file, encoding='utf-8'))
 
-    created = 0
-    # Get the last student number to continue from there
-    last_student = Student.objects.order_by('-sno').first()
-    next_sno = last_student.sno + 1 if last_student else 1
-    
-    for row in reader:
-        # normalize keys (lowercase & strip spaces)
-        row = {k.strip().lower(): (v or "").strip() for k, v in row.items()}
-
-        hallticket = row.get('hallticket')
-        name = row.get('name')
-        course = row.get('course')
-        email = row.get('email') or f"{hallticket}@example.com"  # fallback
-        phone = row.get('phone', '')
-
-        if not hallticket:
-            continue
-
-        # Check if student already exists
-        if Student.objects.filter(hallticket=hallticket).exists():
-            continue
-
-        # Create new student with manual sno
-        stu = Student.objects.create(
-            sno=next_sno,
-            hallticket=hallticket,
-            name=name,
-            course=course,
-            email=email,
-            phone=phone,
-        )
-        stu.template = Template.objects.filter(course=course).first()
-        stu.save()
-        created += 1
-        next_sno += 1
-
-    messages.success(request, f"Imported {created} new students.")
+    messages.success(request, f"Imported {summary['created']} new students ({summary['skipped']} already existed, {summary['invalid']} invalid rows).")
     return redirect('portal:students')
 
-import os
-def _make_and_attach_certificate(student):
-    # choose template (student.template or by course)
-    tpl = student.template or Template.objects.filter(course=student.course).first()
-    if not tpl:
-        raise ValueError("No template found for student's course.")
-    today = date.today().strftime("%d-%m-%Y")
-    im = generate_certificate_image(tpl.file.path, student.name, student.course, today)
-    path = save_certificate(im, settings.MEDIA_ROOT / 'certificates', f"{student.hallticket}_{int(time.time())}")
-    student.last_certificate = path.replace(str(settings.MEDIA_ROOT) + os.sep, '')
-    student.template = tpl
-    student.save()
-    cert = Certificate.objects.create(student=student, template=tpl, file=student.last_certificate)
-    return cert
-
 @login_required
 def send_single(request, sno):
     student = get_object_or_404(Student, sno=sno)
-    try:
-        cert = _make_and_attach_certificate(student)
-        email = EmailMessage(
-            subject="Your Certificate",
-            body=f"Dear {student.name},\n\nPlease find your certificate attached.\n\nRegards,\nCertifyPro",
-            to=[student.email],
-        )
-        email.attach_file(cert.file.path)
-        email.send()
-        log = SendLog.objects.create(student=student, recipient_email=student.email, status='SUCCESS', attachment=cert.file)
-        messages.success(request, f"Certificate sent to {student.email}")
-    except Exception as e:
-        SendLog.objects.create(student=student, recipient_email=student.email, status='ERROR', error_reason=str(e))
-        messages.error(request, f"Failed to send: {e}")
+    # a single send is explicit: deliver even if the ledger has it
+    job = enqueue([student.sno], user=request.user, force=True)
+    request.session['send_job'] = job.pk
+    messages.success(request, f"Certificate for {student.email} queued.")
     return redirect('portal:students')
 
 @login_required
@@ -182,103 +155,178 @@ def bulk_send(request):
     if request.method != 'POST':
         return JsonResponse({'ok': False, 'error': 'POST required'}, status=400)
     
-    select_all = request.POST.get('select_all', '') == 'true'
-    q = request.POST.get('q', '').strip()
-    
-    if select_all:
-        # Get all students matching the search query
-        qs = Student.objects.all()
-        if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(email__icontains=q) | Q(hallticket__icontains=q) | Q(course__icontains=q))
-        student_ids = list(qs.values_list('sno', flat=True))
-    else:
-        # Get selected student IDs
-        student_ids = request.POST.getlist('ids[]')
-    
-    done, errors = 0, 0
-    for sid in student_ids:
-        try:
-            s = Student.objects.get(sno=sid)
-            cert = _make_and_attach_certificate(s)
-            email = EmailMessage(
-                subject="Your Certificate",
-                body=f"Dear {s.name},\n\nPlease find your certificate attached.\n\nRegards,\nCertifyPro",
-                to=[s.email],
-            )
-            email.attach_file(cert.file.path)
-            email.send()
-            SendLog.objects.create(student=s, recipient_email=s.email, status='SUCCESS', attachment=cert.file)
-            done += 1
-        except Exception as e:
-            SendLog.objects.create(student=s, recipient_email=s.email, status='ERROR', error_reason=str(e))
-            errors += 1
+    # rendering and mailing happen in the send worker (manage.py run_send_worker)
+    force = request.POST.get('force', '') == 'true'
+    job = enqueue(_selected_students(request), user=request.user, force=force)
+    request.session['send_job'] = job.pk
     
     # Clear selection after sending
     if 'studentSelection' in request.session:
         del request.session['studentSelection']
     
-    messages.success(request, f"Sent {done} certificates successfully. {errors} failed.")
+    note = f" ({job.skipped} already delivered or queued, skipped)" if job.skipped else ""
+    messages.success(request, f"Queued {job.total} certificates for sending{note}.")
     return redirect('portal:students')
 
+def _selected_students(request):
+    # the q / ids[] / select_all selection posted by the students page
+    if request.POST.get('select_all', '') == 'true':
+        qs = Student.objects.all()
+        q = request.POST.get('q', '').strip()
+        return search_students(qs, q) if q else qs
+    return Student.objects.filter(sno__in=request.POST.getlist('ids[]'))
+
+@login_required
+def bulk_download(request):
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'POST required'}, status=400)
+    qs = _selected_students(request).exclude(last_certificate='').only('sno', 'hallticket', 'last_certificate')
+    chunk_size = getattr(settings, 'CERT_EXPORT_CHUNK_SIZE', 2000)
+    entries = (
+        (f"{s.hallticket}_certificate.pdf", os.path.join(settings.MEDIA_ROOT, s.last_certificate))
+        for chunk in iter_chunks(qs, chunk_size, key='sno')
+        for s in chunk
+    )
+    response = StreamingHttpResponse(stream_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="certificates.zip"'
+    return response
+
+@login_required
+def send_job_status(request, job_id):
+    job = get_object_or_404(SendJob, pk=job_id)
+    data = job_progress(job)
+    if data['status'] == 'DONE' and request.session.get('send_job') == job.pk:
+        del request.session['send_job']
+    return JsonResponse(data)
+
 @login_required
 def reports(request):
     q = request.GET.get('q','').strip()
-    success_qs = SendLog.objects.filter(status='SUCCESS')
-    error_qs = SendLog.objects.filter(status='ERROR')
+    success_qs = SendLog.objects.filter(status='SUCCESS').select_related('student')
+    error_qs = SendLog.objects.filter(status='ERROR').select_related('student')
     if q:
-        success_qs = success_qs.filter(Q(recipient_email__icontains=q) | Q(student__name__icontains=q) | Q(student__phone__icontains=q))
-        error_qs = error_qs.filter(Q(recipient_email__icontains=q) | Q(student__name__icontains=q) | Q(student__phone__icontains=q))
-
-    succ_page = Paginator(success_qs.order_by('-sent_at'), 10).get_page(request.GET.get('succ_page'))
-    err_page  = Paginator(error_qs.order_by('-sent_at'), 10).get_page(request.GET.get('err_page'))
+        success_qs = search_logs(success_qs, q)
+        error_qs = search_logs(error_qs, q)
+
+    # totals come from the rollup, pages from (sent_at, id) cursors: no COUNT(*) over the log
+    totals = stats.totals()
+    succ_page = keyset_page(success_qs, ['sent_at', 'id'], request.GET.get('succ'), per_page=10, descending=True)
+    err_page = keyset_page(error_qs, ['sent_at', 'id'], request.GET.get('err'), per_page=10, descending=True)
+    succ_cursor, err_cursor = request.GET.get('succ', ''), request.GET.get('err', '')
+
+    return render(request, 'portal/reports.html', {
+        'succ_page': succ_page, 'err_page': err_page, 'q': q, 'totals': totals,
+        'succ_cursor': succ_cursor, 'err_cursor': err_cursor,
+    })
 
-    return render(request, 'portal/reports.html', {'succ_page': succ_page, 'err_page': err_page, 'q': q})
+@login_required
+def reports_stats(request):
+    qs = DeliveryStat.objects.all()
+    course = request.GET.get('course', '').strip()
+    if course:
+        qs = qs.filter(course=course)
+    try:
+        if request.GET.get('from'):
+            qs = qs.filter(day__gte=date.fromisoformat(request.GET['from']))
+        if request.GET.get('to'):
+            qs = qs.filter(day__lte=date.fromisoformat(request.GET['to']))
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    days = [
+        {'course': r.course, 'day': r.day.isoformat(), 'sent': r.sent, 'failed': r.failed,
+         'resent': r.resent, 'downloaded': r.downloaded}
+        for r in qs.order_by('day', 'course')
+    ]
+    return JsonResponse({'ok': True, 'totals': stats.totals(qs), 'days': days})
 
 @login_required
 def log_resend(request, log_id):
-    log = get_object_or_404(SendLog, pk=log_id)
+    log = get_object_or_404(SendLog.objects.select_related('student'), pk=log_id)
     student = log.student
+    old_status = log.status
     try:
         # if we have an attachment, reuse; else regenerate
         attach_path = log.attachment.path if log.attachment else None
         if not attach_path:
             cert = _make_and_attach_certificate(student)
             attach_path = cert.file.path
-        email = EmailMessage(
-            subject="Your Certificate (Resent)",
-            body=f"Dear {student.name},\n\nResending your certificate.\n\nRegards,\nCertifyPro",
-            to=[log.recipient_email],
-        )
-        email.attach_file(attach_path)
-        email.send()
+        _, error = Mailer(max_retries=1).send([certificate_email(student, attach_path, to=log.recipient_email, resend=True)])[0]
+        if error:
+            raise error
         log.resend_count += 1
         log.status = 'SUCCESS'
         if not log.attachment:
             log.attachment.name = attach_path.replace(str(settings.MEDIA_ROOT) + '/', '')
         log.error_reason = ''
         log.save()
+        stats.record_change(log, old_status, resent=1)
         messages.success(request, "Resent successfully.")
     except Exception as e:
         log.status = 'ERROR'
         log.error_reason = str(e)
         log.save()
+        stats.record_change(log, old_status)
         messages.error(request, f"Resend failed: {e}")
     return redirect('portal:reports')
 
 @login_required
 def log_download(request, log_id):
-    log = get_object_or_404(SendLog, pk=log_id)
+    log = get_object_or_404(SendLog.objects.select_related('student'), pk=log_id)
     if not log.attachment:
         messages.error(request, "No attachment found.")
         return redirect('portal:reports')
-    log.download_count += 1
-    log.save()
-    with open(log.attachment.path, 'rb') as f:
-        data = f.read()
-    resp = HttpResponse(data, content_type='application/pdf')
-    resp['Content-Disposition'] = f'attachment; filename="{log.student.hallticket}_certificate.pdf"'
+    try:
+        filename = f"{log.student.hallticket if log.student else log.pk}_certificate.pdf"
+        resp = serve_file(request, log.attachment.path, filename, 'application/pdf', media_name=log.attachment.name)
+    except FileNotFoundError:
+        messages.error(request, "Attachment file is missing.")
+        return redirect('portal:reports')
+    if resp.counts_as_download:
+        SendLog.objects.filter(pk=log.pk).update(download_count=F('download_count') + 1)
+        stats.record_download(log)
     return resp
 
+def _preview_response(request, tpl, name, course):
+    # cached downscaled render; the ETag is the preview key, so a 304 skips the disk too
+    if not tpl or not tpl.file:
+        return HttpResponse("No template image to preview.", status=404, content_type='text/plain')
+    fmt = request.GET.get('format') or pick_format(request.headers.get('Accept'))
+    if fmt not in ('webp', 'jpeg'):
+        return HttpResponse("format must be webp or jpeg.", status=400, content_type='text/plain')
+    default_width = getattr(settings, 'CERT_PREVIEW_WIDTH', 800)
+    try:
+        width = min(max(int(request.GET.get('width', default_width)), 64), 2000)
+    except ValueError:
+        width = default_width
+    try:
+        key = preview_key(tpl.render_path, name, course, fmt, width)
+    except FileNotFoundError:
+        return HttpResponse("Template image is missing.", status=404, content_type='text/plain')
+    etag = quote_etag(key)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        path = get_preview(tpl.render_path, name, course, fmt, width, key=key)
+        response = HttpResponse(path.read_bytes(), content_type=f'image/{fmt}')
+    response['ETag'] = etag
+    response['Cache-Control'] = f"private, max-age={getattr(settings, 'CERT_PREVIEW_MAX_AGE', 3600)}"
+    response['Vary'] = 'Accept'
+    return response
+
+@login_required
+def student_preview(request, sno):
+    student = get_object_or_404(Student.objects.select_related('template'), sno=sno)
+    try:
+        tpl = pick_template(student)
+    except ValueError:
+        tpl = None
+    return _preview_response(request, tpl, student.name, student.course)
+
+@login_required
+def template_preview(request, sno):
+    tpl = get_object_or_404(Template, sno=sno)
+    return _preview_response(request, tpl, request.GET.get('name') or "Student Name", tpl.course)
+
 # ----- Templates area -----
 @login_required
 def templates_list(request):
@@ -286,8 +334,16 @@ def templates_list(request):
     qs = Template.objects.all().order_by('sno')
     if q:
         qs = qs.filter(Q(name__icontains=q) | Q(course__icontains=q))
+    page = request.GET.get('page')
+
+    def build():
+        page_obj = Paginator(qs, 10).get_page(page)
+        return page_obj.paginator.count, page_obj.number, list(page_obj.object_list)
+
+    count, number, rows = cached_list('templates', ['template'], [q, page], build)
     paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    paginator.count = count  # already known; skip the COUNT query
+    page_obj = Page(rows, number, paginator)
 
     return render(request, 'portal/templates.html', {
         'page_obj': page_obj,
@@ -300,7 +356,7 @@ def template_create(request):
     if request.method == 'POST':
         form = TemplateForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
+            build_template_derivatives(form.save(), form.derivatives)
             messages.success(request, "Template added.")
             return redirect('portal:templates_list')
     else:
@@ -311,9 +367,15 @@ def template_create(request):
 def template_edit(request, sno):
     obj = get_object_or_404(Template, sno=sno)
     if request.method == 'POST':
+        old_path = obj.render_path if obj.file else None
         form = TemplateForm(request.POST, request.FILES, instance=obj)
         if form.is_valid():
             form.save()
+            if form.derivatives:
+                build_template_derivatives(obj, form.derivatives)
+            # drop cached renders of the old and new image
+            for path in {old_path, obj.render_path if obj.file else None} - {None}:
+                invalidate_template_cache(path)
             messages.success(request, "Template updated.")
             return redirect('portal:templates_list')
     else:
@@ -322,20 +384,23 @@ def template_edit(request, sno):
 
 @login_required
 def template_delete(request, sno):
-    get_object_or_404(Template, sno=sno).delete()
+    tpl = get_object_or_404(Template, sno=sno)
+    if tpl.file:
+        invalidate_template_cache(tpl.render_path)
+    tpl.render_file.delete(save=False)
+    tpl.thumbnail.delete(save=False)
+    tpl.delete()
     messages.info(request, "Template deleted.")
     return redirect('portal:templates_list')
 
 @login_required
 def templates_export_csv(request):
-    qs = Template.objects.all().order_by('sno')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="templates.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['sno','name','course','template_type','file'])
-    for t in qs:
-        writer.writerow([t.sno, t.name, t.course, t.template_type, t.file.name])
-    return response
+    chunk_size = getattr(settings, 'CERT_EXPORT_CHUNK_SIZE', 2000)
+    rows = (
+        [[t.sno, t.name, t.course, t.template_type, t.file.name] for t in chunk]
+        for chunk in iter_chunks(Template.objects.all(), chunk_size, key='sno')
+    )
+    return _stream_csv('templates.csv', ['sno','name','course','template_type','file'], rows)
 
 @login_required
 def templates_import_csv(request):
@@ -347,15 +412,23 @@ def templates_import_csv(request):
         return redirect('portal:templates_list')
     data = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8')
     reader = csv.DictReader(data)
-    created = 0
+    rows = {}
     for row in reader:
         name = row.get('name','').strip()
         course = row.get('course','').strip()
         ttype = row.get('template_type','landscape').strip()
         # file column ignored on CSV import (images must be uploaded via form)
         if name and course:
-            Template.objects.get_or_create(name=name, course=course, defaults={'template_type': ttype, 'file': None})
-            created += 1
+            rows.setdefault((name, course), ttype)
+    # one lookup for the existing (name, course) pairs instead of get_or_create per row
+    existing = set()
+    names = sorted({name for name, _ in rows})
+    for i in range(0, len(names), 500):
+        existing.update(Template.objects.filter(name__in=names[i:i + 500]).values_list('name', 'course'))
+    new = [Template(name=name, course=course, template_type=ttype) for (name, course), ttype in rows.items() if (name, course) not in existing]
+    Template.objects.bulk_create(new, batch_size=500)
+    listcache.bump('template')  # bulk_create skips the post_save signal
+    created = len(new)
     messages.success(request, f"Imported {created} templates (upload images individually).")
     return redirect('portal:templates_list')
 
@@ -365,26 +438,19 @@ def bulk_delete(request):
     if request.method != 'POST':
         return JsonResponse({'ok': False, 'error': 'POST required'}, status=400)
     
-    select_all = request.POST.get('select_all', '') == 'true'
-    q = request.POST.get('q', '').strip()
-    
-    if select_all:
-        # Get all students matching the search query
-        qs = Student.objects.all()
-        if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(email__icontains=q) | Q(hallticket__icontains=q) | Q(course__icontains=q))
-        deleted_count = qs.count()
-        qs.delete()
-    else:
-        # Get selected student IDs
-        student_ids = request.POST.getlist('ids[]')
-        qs = Student.objects.filter(sno__in=student_ids)
-        deleted_count = qs.count()
-        qs.delete()
+    qs = _selected_students(request)
+    # bounded chunks; freed certificate files are removed by the send worker
+    deleted_count = delete_students(qs)
     
     # Clear selection after deletion
     if 'studentSelection' in request.session:
         del request.session['studentSelection']
     
     messages.success(request, f"Deleted {deleted_count} students successfully.")
-    return redirect('portal:students')
\ No newline at end of file
+    return redirect('portal:students')
+
+@login_required
+def metrics_view(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff only.")
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')